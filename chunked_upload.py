@@ -0,0 +1,448 @@
+"""Resumable uploads sent as numbered, checksummed parts.
+
+Clients create an upload, ``PUT`` its parts in any order and from any number
+of connections, then ask for it to be completed. Parts are appended to the
+upload file as soon as they are contiguous, hashed as they are appended and,
+for CSV files, scanned for VINs on the way, so completing a large upload
+needs neither a second read of the file nor a parse.
+
+This module deliberately avoids importing Flask or the app module; the app
+keeps one :class:`ChunkedUploadStore` per process and turns its results into
+HTTP responses and jobs.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional
+
+from vin_ingest import INCREMENTAL_EXTENSIONS, UploadTooLarge, save_stream, scan_csv_vin_values, unique_vins
+
+# How long an assembler may hold an upload before another process may take over.
+ASSEMBLY_LEASE_SECONDS = 60
+
+
+def _utc_now_iso() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class ChunkedUploadStore:
+    """Parts, assembly state and scanned VINs of chunked uploads.
+
+    State lives in the ``uploads`` and ``upload_parts`` tables and in files
+    under ``upload_dir``, so any worker can accept a part. Assembly runs in
+    one process at a time under a lease in the ``uploads`` row; the app only
+    assembles in the process holding the background lease, which keeps the
+    running SHA-256 of each upload in memory. If that process changes, the
+    new one re-hashes the assembled prefix once and carries on.
+    """
+
+    def __init__(self, db_path, upload_dir, max_bytes: int):
+        self.db_path = db_path
+        self.upload_dir = Path(upload_dir)
+        self.max_bytes = max_bytes
+        self._hashers = {}
+        self._hashers_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def parts_dir(self, upload_id: str) -> Path:
+        return self.upload_dir / f"parts_{upload_id}"
+
+    def vins_path(self, upload_id: str) -> Path:
+        return self.upload_dir / f"vins_{upload_id}.txt"
+
+    def assembled_path(self, row) -> Path:
+        return self.upload_dir / row["stored_upload_name"]
+
+    def _part_path(self, upload_id: str, part_number: int, sha256: str) -> Path:
+        # Named by checksum so a racing resend with other bytes can't replace an accepted part.
+        return self.parts_dir(upload_id) / f"{part_number}.{sha256}.part"
+
+    def create(self, original_name: str, total_parts, columns, decode_mode: str) -> str:
+        upload_id = uuid.uuid4().hex
+        now = _utc_now_iso()
+        conn = self._connect()
+        conn.execute(
+            """
+            INSERT INTO uploads (
+                upload_id, filename, stored_upload_name, field_list, decode_mode, total_parts, created_at, updated_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                upload_id,
+                original_name,
+                f"source_{upload_id}_{original_name}",
+                json.dumps(columns),
+                decode_mode,
+                total_parts,
+                now,
+                now,
+            ),
+        )
+        conn.commit()
+        conn.close()
+        self.parts_dir(upload_id).mkdir(parents=True, exist_ok=True)
+        return upload_id
+
+    def get(self, upload_id: str):
+        conn = self._connect()
+        row = conn.execute("SELECT * FROM uploads WHERE upload_id = ?", (upload_id,)).fetchone()
+        conn.close()
+        return row
+
+    def list_parts(self, upload_id: str):
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT part_number, size, sha256 FROM upload_parts WHERE upload_id = ? ORDER BY part_number",
+            (upload_id,),
+        ).fetchall()
+        conn.close()
+        return rows
+
+    def save_part(self, row, part_number: int, stream, expected_sha256: str):
+        """Store one part after checking its SHA-256; return ``(status_code, message)`` on rejection.
+
+        Parts are immutable once accepted: resending the same bytes is a no-op,
+        different bytes under the same number are refused, and so is a part
+        numbered above ``total_parts``, even one declared while it was in flight.
+        """
+        upload_id = row["upload_id"]
+        conn = self._connect()
+        try:
+            existing = conn.execute(
+                "SELECT sha256 FROM upload_parts WHERE upload_id = ? AND part_number = ?",
+                (upload_id, part_number),
+            ).fetchone()
+            received_bytes = conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM upload_parts WHERE upload_id = ?",
+                (upload_id,),
+            ).fetchone()[0]
+        finally:
+            conn.close()
+
+        if existing:
+            return self._duplicate_part(existing, part_number, expected_sha256)
+
+        parts_dir = self.parts_dir(upload_id)
+        parts_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = parts_dir / f"{part_number}.part.{uuid.uuid4().hex}.tmp"
+        part_path = self._part_path(upload_id, part_number, expected_sha256)
+        try:
+            size, sha256 = save_stream(stream, tmp_path, max_bytes=self.max_bytes - received_bytes)
+            if sha256 != expected_sha256:
+                return 422, f"Checksum mismatch for part {part_number}; please resend it."
+            if size == 0:
+                return 422, "Parts must not be empty."
+            os.replace(tmp_path, part_path)
+        except UploadTooLarge as exc:
+            return 413, str(exc)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+        conn = self._connect()
+        try:
+            with conn:
+                inserted = conn.execute(
+                    """
+                    INSERT OR IGNORE INTO upload_parts (upload_id, part_number, size, sha256)
+                    SELECT upload_id, ?, ?, ? FROM uploads
+                    WHERE upload_id = ? AND job_id IS NULL AND (total_parts IS NULL OR ? <= total_parts)
+                    """,
+                    (part_number, size, sha256, upload_id, part_number),
+                ).rowcount
+                if inserted:
+                    conn.execute("UPDATE uploads SET updated_at = ? WHERE upload_id = ?", (_utc_now_iso(), upload_id))
+            if inserted:
+                return None
+            current = conn.execute("SELECT total_parts, job_id FROM uploads WHERE upload_id = ?", (upload_id,)).fetchone()
+            existing = conn.execute(
+                "SELECT sha256 FROM upload_parts WHERE upload_id = ? AND part_number = ?",
+                (upload_id, part_number),
+            ).fetchone()
+        finally:
+            conn.close()
+
+        if existing:
+            # Another request stored this part first.
+            if existing["sha256"] != sha256:
+                part_path.unlink(missing_ok=True)
+            return self._duplicate_part(existing, part_number, expected_sha256)
+        part_path.unlink(missing_ok=True)
+        if current is None:
+            return 404, "Upload not found."
+        if current["job_id"]:
+            return 409, "Upload is already complete."
+        return 400, f"Part number must be between 1 and {current['total_parts']}."
+
+    @staticmethod
+    def _duplicate_part(existing, part_number: int, expected_sha256: str):
+        if existing["sha256"] == expected_sha256:
+            return None
+        return 409, f"Part {part_number} was already received with a different checksum."
+
+    def declare_total_parts(self, upload_id: str, total_parts: int) -> List[int]:
+        """Fix the number of parts; parts numbered above it are discarded and returned."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            extra = conn.execute(
+                "SELECT part_number, sha256 FROM upload_parts WHERE upload_id = ? AND part_number > ?",
+                (upload_id, total_parts),
+            ).fetchall()
+            conn.execute("DELETE FROM upload_parts WHERE upload_id = ? AND part_number > ?", (upload_id, total_parts))
+            conn.execute(
+                "UPDATE uploads SET total_parts = ? WHERE upload_id = ? AND job_id IS NULL",
+                (total_parts, upload_id),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+        for part in extra:
+            self._part_path(upload_id, part["part_number"], part["sha256"]).unlink(missing_ok=True)
+        return [part["part_number"] for part in extra]
+
+    def _claim(self, conn: sqlite3.Connection, upload_id: str, lease_seconds: float, require_assembled: bool = False) -> bool:
+        now = time.time()
+        assembled = "AND total_parts IS NOT NULL AND assembled_parts = total_parts" if require_assembled else ""
+        with conn:
+            cursor = conn.execute(
+                f"""
+                UPDATE uploads SET lease_until = ?
+                WHERE upload_id = ? AND job_id IS NULL AND (lease_until IS NULL OR lease_until < ?) {assembled}
+                """,
+                (now + lease_seconds, upload_id, now),
+            )
+        return cursor.rowcount == 1
+
+    def _next_part_ready(self, conn: sqlite3.Connection, upload_id: str) -> bool:
+        return (
+            conn.execute(
+                """
+                SELECT 1 FROM uploads
+                JOIN upload_parts
+                  ON upload_parts.upload_id = uploads.upload_id
+                 AND upload_parts.part_number = uploads.assembled_parts + 1
+                WHERE uploads.upload_id = ? AND uploads.job_id IS NULL
+                """,
+                (upload_id,),
+            ).fetchone()
+            is not None
+        )
+
+    def scan_vins(self, row, final: bool = False):
+        """Extract VINs from the assembled bytes not scanned yet; return the new scan state.
+
+        Values are appended to a side file, one JSON string per line, so the
+        scan can continue in any worker process. Both files are truncated to
+        their recorded sizes first, which discards output from an attempt
+        that died before saving its state.
+        """
+        with open(self.assembled_path(row), "rb") as source:
+            source.seek(row["scan_offset"])
+            values, vin_column, consumed = scan_csv_vin_values(source, row["scan_column"], final=final)
+
+        with open(self.vins_path(row["upload_id"]), "ab") as handle:
+            handle.truncate(row["vins_bytes"])
+            if values:
+                handle.write("".join(json.dumps(value) + "\n" for value in values).encode("utf-8"))
+            vins_bytes = handle.tell()
+        return {
+            "scan_offset": row["scan_offset"] + consumed,
+            "scan_column": vin_column,
+            "vins_found": row["vins_found"] + len(values),
+            "vins_bytes": vins_bytes,
+        }
+
+    def read_scanned_vins(self, row):
+        """Unique, upper-cased VINs from a fully scanned CSV upload, or ``None`` without a VIN column."""
+        if row["scan_column"] is None:
+            return None
+        with open(self.vins_path(row["upload_id"]), "rb") as handle:
+            data = handle.read(row["vins_bytes"]).decode("utf-8")
+        return unique_vins(json.loads(line) for line in data.splitlines())
+
+    def _take_hasher(self, upload_id: str, assembled_path: Path, assembled_bytes: int):
+        with self._hashers_lock:
+            cached = self._hashers.pop(upload_id, None)
+        if cached is not None and cached[0] == assembled_bytes:
+            return cached[1]
+
+        # First part seen by this process: hash what is already assembled.
+        digest = hashlib.sha256()
+        remaining = assembled_bytes
+        with open(assembled_path, "rb") as handle:
+            while remaining > 0:
+                chunk = handle.read(min(remaining, 1024 * 1024))
+                if not chunk:
+                    break
+                digest.update(chunk)
+                remaining -= len(chunk)
+        return digest
+
+    def _append_ready_parts(self, conn: sqlite3.Connection, upload_id: str) -> None:
+        row = conn.execute("SELECT * FROM uploads WHERE upload_id = ?", (upload_id,)).fetchone()
+        assembled_path = self.assembled_path(row)
+        incremental = Path(row["filename"]).suffix.lower() in INCREMENTAL_EXTENSIONS
+
+        with open(assembled_path, "ab") as handle:
+            handle.truncate(row["assembled_bytes"])
+            while True:
+                part_number = row["assembled_parts"] + 1
+                part = conn.execute(
+                    "SELECT size, sha256 FROM upload_parts WHERE upload_id = ? AND part_number = ?",
+                    (upload_id, part_number),
+                ).fetchone()
+                if part is None:
+                    return
+
+                digest = self._take_hasher(upload_id, assembled_path, row["assembled_bytes"])
+                part_path = self._part_path(upload_id, part_number, part["sha256"])
+                with open(part_path, "rb") as source:
+                    for chunk in iter(lambda: source.read(1024 * 1024), b""):
+                        handle.write(chunk)
+                        digest.update(chunk)
+                handle.flush()
+
+                assembled_bytes = row["assembled_bytes"] + part["size"]
+                state = {
+                    "assembled_parts": part_number,
+                    "assembled_bytes": assembled_bytes,
+                    "content_sha256": digest.hexdigest(),
+                }
+                if incremental:
+                    state.update(self.scan_vins(row))
+                assignments = ", ".join(f"{key} = ?" for key in state)
+                with conn:
+                    conn.execute(
+                        f"UPDATE uploads SET {assignments}, lease_until = ?, updated_at = ? WHERE upload_id = ?",
+                        (*state.values(), time.time() + ASSEMBLY_LEASE_SECONDS, _utc_now_iso(), upload_id),
+                    )
+                with self._hashers_lock:
+                    self._hashers[upload_id] = (assembled_bytes, digest)
+                part_path.unlink(missing_ok=True)
+                row = conn.execute("SELECT * FROM uploads WHERE upload_id = ?", (upload_id,)).fetchone()
+
+    def advance(self, upload_id: str) -> None:
+        """Append received parts to the upload file in order, as far as they are contiguous.
+
+        The lease in the ``uploads`` row lets one thread assemble at a time;
+        others return straight away and the holder picks up their parts
+        before letting go.
+        """
+        conn = self._connect()
+        try:
+            while self._claim(conn, upload_id, ASSEMBLY_LEASE_SECONDS):
+                try:
+                    self._append_ready_parts(conn, upload_id)
+                finally:
+                    with conn:
+                        conn.execute("UPDATE uploads SET lease_until = NULL WHERE upload_id = ?", (upload_id,))
+                # A part stored while we held the lease may not have been seen.
+                if not self._next_part_ready(conn, upload_id):
+                    break
+        finally:
+            conn.close()
+
+    def advance_ready(self) -> int:
+        """Assemble every upload whose next part has arrived; return how many were advanced."""
+        conn = self._connect()
+        upload_ids = [
+            row["upload_id"]
+            for row in conn.execute(
+                """
+                SELECT uploads.upload_id FROM uploads
+                JOIN upload_parts
+                  ON upload_parts.upload_id = uploads.upload_id
+                 AND upload_parts.part_number = uploads.assembled_parts + 1
+                WHERE uploads.job_id IS NULL AND (uploads.lease_until IS NULL OR uploads.lease_until < ?)
+                """,
+                (time.time(),),
+            )
+        ]
+        conn.close()
+        for upload_id in upload_ids:
+            self.advance(upload_id)
+        return len(upload_ids)
+
+    def claim_completion(self, upload_id: str, lease_seconds: float):
+        """Lease a fully assembled upload for turning into a job; return its row, or ``None``.
+
+        ``None`` means the upload is still being assembled, another request is
+        completing it, or it already has a job.
+        """
+        conn = self._connect()
+        try:
+            if not self._claim(conn, upload_id, lease_seconds, require_assembled=True):
+                return None
+            return conn.execute("SELECT * FROM uploads WHERE upload_id = ?", (upload_id,)).fetchone()
+        finally:
+            conn.close()
+
+    def release(self, upload_id: str) -> None:
+        """Give up a completion claim and keep the assembled file, so ``complete`` can be retried."""
+        conn = self._connect()
+        with conn:
+            conn.execute("UPDATE uploads SET lease_until = NULL WHERE upload_id = ?", (upload_id,))
+        conn.close()
+
+    def mark_completed(self, upload_id: str, job_id: str) -> None:
+        """Record the job once its row is committed; the assembled file now belongs to it."""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "UPDATE uploads SET job_id = ?, lease_until = NULL, updated_at = ? WHERE upload_id = ?",
+                (job_id, _utc_now_iso(), upload_id),
+            )
+        conn.close()
+        self._delete_files(upload_id)
+
+    def delete(self, upload_id: str, stored_upload_name: Optional[str] = None) -> None:
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM upload_parts WHERE upload_id = ?", (upload_id,))
+            conn.execute("DELETE FROM uploads WHERE upload_id = ?", (upload_id,))
+        conn.close()
+        self._delete_files(upload_id, stored_upload_name)
+
+    def _delete_files(self, upload_id: str, stored_upload_name: Optional[str] = None) -> None:
+        with self._hashers_lock:
+            self._hashers.pop(upload_id, None)
+        shutil.rmtree(self.parts_dir(upload_id), ignore_errors=True)
+        self.vins_path(upload_id).unlink(missing_ok=True)
+        if stored_upload_name:
+            (self.upload_dir / stored_upload_name).unlink(missing_ok=True)
+
+    def delete_stale_batch(self, conn: sqlite3.Connection, cutoff_iso: str, batch_size: int) -> int:
+        stale_uploads = conn.execute(
+            """
+            SELECT upload_id, stored_upload_name, job_id
+            FROM uploads
+            WHERE updated_at < ?
+            ORDER BY updated_at
+            LIMIT ?
+            """,
+            (cutoff_iso, batch_size),
+        ).fetchall()
+
+        for row in stale_uploads:
+            # A completed upload's file now belongs to its job.
+            self._delete_files(row["upload_id"], None if row["job_id"] else row["stored_upload_name"])
+
+        if stale_uploads:
+            upload_ids = [(row["upload_id"],) for row in stale_uploads]
+            conn.executemany("DELETE FROM upload_parts WHERE upload_id = ?", upload_ids)
+            conn.executemany("DELETE FROM uploads WHERE upload_id = ?", upload_ids)
+            conn.commit()
+        return len(stale_uploads)
@@ -22,6 +22,13 @@ def _env_float(name: str, default: float) -> float:
         return default
 
 
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
 class BaseConfig:
     ENV_NAME = "base"
     TESTING = False
@@ -29,22 +36,57 @@ class BaseConfig:
     BASE_DIR = Path(os.getenv("VIN_DECODER_BASE_DIR") or SCRIPT_DIR).resolve()
     TEMPLATE_DIR = BASE_DIR / "templates"
     STATIC_DIR = BASE_DIR / "static"
-    UPLOAD_DIR = BASE_DIR / "uploads"
-    DATA_DIR = BASE_DIR / "data"
-    LOG_DIR = BASE_DIR / "logs"
+    UPLOAD_DIR = Path(os.getenv("VIN_DECODER_UPLOAD_DIR") or (BASE_DIR / "uploads"))
+    DATA_DIR = Path(os.getenv("VIN_DECODER_DATA_DIR") or (BASE_DIR / "data"))
+    LOG_DIR = Path(os.getenv("VIN_DECODER_LOG_DIR") or (BASE_DIR / "logs"))
 
     DB_PATH = Path(os.getenv("VIN_DECODER_DB_PATH") or (DATA_DIR / "vin_decoder.sqlite3"))
     TEMPLATE_DOWNLOAD_FILE = STATIC_DIR / "vin_upload_template.csv"
+    FUEL_ECONOMY_CSV = Path(os.getenv("VIN_DECODER_FUEL_ECONOMY_CSV") or (DATA_DIR / "vehicles.csv"))
+    VPIC_OFFLINE_DB = Path(os.getenv("VIN_DECODER_VPIC_OFFLINE_DB") or (DATA_DIR / "vpic.sqlite3"))
 
+    NHTSA_API_BASE = os.getenv("VIN_DECODER_NHTSA_API_BASE", "https://vpic.nhtsa.dot.gov/api/vehicles/decodevin/")
     REQUEST_TIMEOUT_SECONDS = _env_float("VIN_DECODER_REQUEST_TIMEOUT_SECONDS", 15)
     DEFAULT_RATE_LIMIT = os.getenv("VIN_DECODER_DEFAULT_RATE_LIMIT", "500 per minute")
-    RATE_LIMIT_STORAGE_URI = os.getenv("VIN_DECODER_RATE_LIMIT_STORAGE_URI", "memory://")
+    RATE_LIMIT_STORAGE_URI = os.getenv("VIN_DECODER_RATE_LIMIT_STORAGE_URI", "sqlite://")
 
     CACHE_TTL_HOURS = _env_int("VIN_DECODER_CACHE_TTL_HOURS", 168)
+    CACHE_HARD_TTL_HOURS = _env_int("VIN_DECODER_CACHE_HARD_TTL_HOURS", 2160)
+    CACHE_REFRESH_PER_MINUTE = _env_int("VIN_DECODER_CACHE_REFRESH_PER_MINUTE", 30)
+    CACHE_REFRESH_MAX_PENDING = _env_int("VIN_DECODER_CACHE_REFRESH_MAX_PENDING", 1000)
     CLEANUP_TTL_HOURS = _env_int("VIN_DECODER_CLEANUP_TTL_HOURS", 24)
+    CLEANUP_SCHEDULER_ENABLED = _env_bool("VIN_DECODER_CLEANUP_SCHEDULER_ENABLED", True)
+    CLEANUP_INTERVAL_SECONDS = _env_float("VIN_DECODER_CLEANUP_INTERVAL_SECONDS", 300)
+    CLEANUP_BATCH_SIZE = _env_int("VIN_DECODER_CLEANUP_BATCH_SIZE", 200)
+    CLEANUP_TIME_BUDGET_SECONDS = _env_float("VIN_DECODER_CLEANUP_TIME_BUDGET_SECONDS", 2)
     JOB_POLL_INTERVAL_MS = _env_int("VIN_DECODER_JOB_POLL_INTERVAL_MS", 3000)
+    JOB_WORKERS = _env_int("VIN_DECODER_JOB_WORKERS", 2)
+    JOB_SCHEDULING_POLICY = os.getenv("VIN_DECODER_JOB_SCHEDULING_POLICY", "shortest_remaining").lower()
+    JOB_STARVATION_LIMIT = _env_int("VIN_DECODER_JOB_STARVATION_LIMIT", 50)
+    JOB_PROGRESS_INTERVAL_SECONDS = _env_float("VIN_DECODER_JOB_PROGRESS_INTERVAL_SECONDS", 1)
+    BACKGROUND_LEASE_SECONDS = _env_float("VIN_DECODER_BACKGROUND_LEASE_SECONDS", 15)
+    BACKGROUND_POLL_SECONDS = _env_float("VIN_DECODER_BACKGROUND_POLL_SECONDS", 1)
+    ADMISSION_MAX_QUEUED_VINS = _env_int("VIN_DECODER_ADMISSION_MAX_QUEUED_VINS", 50000)
+    ADMISSION_ACTIVE_JOB_WINDOW_MINUTES = _env_int("VIN_DECODER_ADMISSION_ACTIVE_JOB_WINDOW_MINUTES", 15)
+    ADMISSION_FALLBACK_VINS_PER_SECOND = _env_float("VIN_DECODER_ADMISSION_FALLBACK_VINS_PER_SECOND", 2)
+    ADMISSION_MAX_CONCURRENT_PARSES = _env_int("VIN_DECODER_ADMISSION_MAX_CONCURRENT_PARSES", 2)
+    ADMISSION_MAX_PARSE_MEMORY_MB = _env_int("VIN_DECODER_ADMISSION_MAX_PARSE_MEMORY_MB", 256)
+    ADMISSION_PARSE_MEMORY_FACTOR = _env_float("VIN_DECODER_ADMISSION_PARSE_MEMORY_FACTOR", 4)
+    ADMISSION_PARSE_SLOT_WAIT_SECONDS = _env_float("VIN_DECODER_ADMISSION_PARSE_SLOT_WAIT_SECONDS", 5)
+    DEFAULT_DECODE_MODE = os.getenv("VIN_DECODER_DEFAULT_DECODE_MODE", "online").lower()
+    VPIC_OFFLINE_FALLBACK = _env_bool("VIN_DECODER_VPIC_OFFLINE_FALLBACK", True)
+    DEFAULT_FIELD_PROFILE = os.getenv("VIN_DECODER_DEFAULT_FIELD_PROFILE", "full").lower()
+    RESULTS_PAGE_SIZE = _env_int("VIN_DECODER_RESULTS_PAGE_SIZE", 100)
+    RESULTS_PAGE_MAX = _env_int("VIN_DECODER_RESULTS_PAGE_MAX", 1000)
     MAX_CONTENT_LENGTH = _env_int("VIN_DECODER_MAX_CONTENT_LENGTH_MB", 16) * 1024 * 1024
+    CHUNKED_UPLOAD_MAX_MB = _env_int("VIN_DECODER_CHUNKED_UPLOAD_MAX_MB", 1024)
+    CHUNKED_UPLOAD_PART_MB = _env_int("VIN_DECODER_CHUNKED_UPLOAD_PART_MB", 8)
+    CHUNKED_UPLOAD_TTL_HOURS = _env_int("VIN_DECODER_CHUNKED_UPLOAD_TTL_HOURS", 24)
+    CHUNKED_UPLOAD_RETRY_AFTER_SECONDS = _env_int("VIN_DECODER_CHUNKED_UPLOAD_RETRY_AFTER_SECONDS", 2)
     MAX_RECENT_JOBS = _env_int("VIN_DECODER_MAX_RECENT_JOBS", 8)
+    UPLOAD_DEDUPE_WINDOW_HOURS = _env_int("VIN_DECODER_UPLOAD_DEDUPE_WINDOW_HOURS", 12)
+    EXCEL_PARSE_IN_SUBPROCESS = _env_bool("VIN_DECODER_EXCEL_PARSE_IN_SUBPROCESS", True)
+    EXCEL_PARSE_TIMEOUT_SECONDS = _env_float("VIN_DECODER_EXCEL_PARSE_TIMEOUT_SECONDS", 300)
     LOG_LEVEL = os.getenv("VIN_DECODER_LOG_LEVEL", "INFO").upper()
 
 
@@ -61,6 +103,9 @@ class TestingConfig(BaseConfig):
     TESTING = True
     DEFAULT_RATE_LIMIT = "1000 per minute"
     CLEANUP_TTL_HOURS = 1
+    CLEANUP_SCHEDULER_ENABLED = False
+    BACKGROUND_POLL_SECONDS = 0
+    EXCEL_PARSE_IN_SUBPROCESS = False
 
 
 ConfigType = Type[BaseConfig]
@@ -0,0 +1,152 @@
+"""Offline MPG lookups from a fueleconomy.gov ``vehicles.csv`` snapshot.
+
+Download the snapshot from https://www.fueleconomy.gov/feg/download.shtml
+(``vehicles.csv``) and point ``VIN_DECODER_FUEL_ECONOMY_CSV`` at it. The file
+is read once into a small in-memory index; every lookup after that is a dict
+access, with fuzzy model matching memoized per make/model/year.
+"""
+
+import csv
+import difflib
+import functools
+import re
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+NO_DATA = "No Data"
+
+_NON_ALNUM = re.compile(r"[^A-Z0-9]+")
+
+# Drive/body suffixes fueleconomy.gov appends to model names ("F150 Pickup 2WD").
+# Powertrain words stay in the key: a hybrid and its gasoline sibling differ
+# far more in MPG than two drivetrains do.
+_MODEL_NOISE = re.compile(r"\b(2WD|4WD|AWD|FWD|RWD|4X4|4X2|PICKUP|WAGON|VAN|CAB CHASSIS)\b")
+_POWERTRAIN_WORDS = ("HYBRID", "PLUGIN", "PHEV", "ELECTRIC", "FFV", "DIESEL", "CNG")
+
+MpgTuple = Tuple[int, int, int]
+
+
+def normalize_make(value) -> str:
+    return _NON_ALNUM.sub("", str(value or "").upper())
+
+
+def normalize_model(value) -> str:
+    text = _MODEL_NOISE.sub(" ", str(value or "").upper())
+    return _NON_ALNUM.sub("", text)
+
+
+def _adds_powertrain(name: str, model: str) -> bool:
+    shorter, longer = sorted((name, model), key=len)
+    extra = longer[len(shorter):]
+    return any(word in extra for word in _POWERTRAIN_WORDS)
+
+
+def _similarity(a: str, b: str) -> float:
+    return difflib.SequenceMatcher(None, a, b).ratio()
+
+
+def _parse_year(value) -> Optional[int]:
+    try:
+        return int(float(str(value).strip()))
+    except (TypeError, ValueError):
+        return None
+
+
+class FuelEconomyIndex:
+    """City/highway/combined MPG keyed on normalized make, year and model.
+
+    Rows for the same model (engine and drivetrain variants) are averaged,
+    so each make/year bucket holds one small tuple per model.
+    """
+
+    def __init__(self, entries: Dict[Tuple[str, int], Dict[str, MpgTuple]], cache_size: int = 4096):
+        self._entries = entries
+        self.lookup = functools.lru_cache(maxsize=cache_size)(self._lookup)
+
+    @classmethod
+    def from_csv(cls, path, cache_size: int = 4096) -> "FuelEconomyIndex":
+        sums = defaultdict(lambda: [0, 0, 0, 0])
+        with open(path, newline="", encoding="utf-8-sig") as handle:
+            for row in csv.DictReader(handle):
+                make = normalize_make(row.get("make"))
+                year = _parse_year(row.get("year"))
+                if not make or year is None:
+                    continue
+                try:
+                    mpg = (int(row["city08"]), int(row["highway08"]), int(row["comb08"]))
+                except (KeyError, TypeError, ValueError):
+                    continue
+
+                model = normalize_model(row.get("model"))
+                base_model = normalize_model(row.get("baseModel"))
+                models = {model}
+                # "Camry Hybrid" has base model "Camry"; don't fold it into the gasoline car.
+                if base_model and not _adds_powertrain(model, base_model):
+                    models.add(base_model)
+                for model in models:
+                    if not model:
+                        continue
+                    total = sums[(make, year, model)]
+                    total[0] += mpg[0]
+                    total[1] += mpg[1]
+                    total[2] += mpg[2]
+                    total[3] += 1
+
+        entries = defaultdict(dict)
+        for (make, year, model), (city, highway, combined, count) in sums.items():
+            entries[(make, year)][model] = (
+                round(city / count),
+                round(highway / count),
+                round(combined / count),
+            )
+        return cls(dict(entries), cache_size=cache_size)
+
+    def __len__(self) -> int:
+        return sum(len(models) for models in self._entries.values())
+
+    def _lookup(self, make: str, model: str, year: int) -> Optional[MpgTuple]:
+        """Match ``model`` exactly, else by a unique prefix, else by a unique close spelling.
+
+        Two equally good candidates ("Transit" for "Transit Connect" and
+        "Transit Custom") mean no answer rather than a guess, and a prefix
+        never bridges a powertrain word ("Accord" is not "Accord Hybrid").
+        """
+        models = self._entries.get((make, year))
+        if not models or not model:
+            return None
+        if model in models:
+            return models[model]
+
+        prefixed = [
+            name
+            for name in models
+            if (name.startswith(model) or model.startswith(name)) and not _adds_powertrain(name, model)
+        ]
+        if prefixed:
+            return models[prefixed[0]] if len(prefixed) == 1 else None
+
+        close = difflib.get_close_matches(model, list(models), n=2, cutoff=0.8)
+        if not close:
+            return None
+        if len(close) > 1 and _similarity(model, close[0]) == _similarity(model, close[1]):
+            return None
+        return models[close[0]]
+
+    def get_mpg(self, make, model, year) -> Dict[str, object]:
+        parsed_year = _parse_year(year)
+        match = None
+        if parsed_year is not None:
+            match = self.lookup(normalize_make(make), normalize_model(model), parsed_year)
+
+        if match is None:
+            return {"MPG City": NO_DATA, "MPG Highway": NO_DATA, "MPG Combined": NO_DATA}
+        city, highway, combined = match
+        return {"MPG City": city, "MPG Highway": highway, "MPG Combined": combined}
+
+
+def load_fuel_economy_index(path) -> Optional[FuelEconomyIndex]:
+    """Return an index for ``path``, or ``None`` when no snapshot is configured."""
+    if not path or not Path(path).is_file():
+        return None
+    return FuelEconomyIndex.from_csv(path)
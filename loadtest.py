@@ -0,0 +1,654 @@
+"""HTTP load and soak test for the VIN decoder.
+
+Starts a stub vPIC upstream in this process and the real app in a child
+process (Gunicorn when installed, otherwise the Werkzeug server), pointed at
+a throwaway data directory. Virtual users then upload VIN files, poll
+``/status/<job_id>`` until their job finishes and download the result::
+
+    python loadtest.py --users 50 --duration 600
+    python loadtest.py --users 20 --duration 4h --report-interval 300 --json soak.json
+
+Every report line shows per-route p50/p95/p99 latency, error and shed
+(429/503) counts, "database is locked" lines in the server log and the
+resident memory of the server process tree. The final summary adds the
+memory growth rate over the run, which is the number to watch in a soak.
+
+This module only talks HTTP to the app and never imports it.
+"""
+
+import argparse
+import io
+import json
+import math
+import os
+import random
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import requests
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+
+VIN_CHARS = "ABCDEFGHJKLMNPRSTUVWXYZ0123456789"
+
+LOCKED_PATTERN = re.compile(rb"database is locked")
+
+STUB_VEHICLES = (
+    ("HONDA", "Accord", "Passenger Car", "Sedan/Saloon", "4"),
+    ("FORD", "F-150", "Truck", "Pickup", "6"),
+    ("TOYOTA", "Prius", "Passenger Car", "Hatchback/Liftback/Notchback", "4"),
+    ("FREIGHTLINER", "Cascadia", "Truck", "Truck-Tractor", "6"),
+    ("RAM", "ProMaster 2500", "Truck", "Cargo Van", "6"),
+)
+
+ROUTES = ("upload", "status", "download")
+
+
+def parse_duration(value: str) -> float:
+    """Seconds from ``90``, ``90s``, ``15m`` or ``4h``."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([smh]?)\s*", value)
+    if not match:
+        raise argparse.ArgumentTypeError(f"invalid duration: {value}")
+    return float(match.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600}[match.group(2)]
+
+
+class LatencyHistogram:
+    """Log-bucketed latencies, so a multi-hour run keeps a few hundred counters, not every sample.
+
+    Buckets are 5% wide; reported percentiles are the bucket's upper bound.
+    """
+
+    BASE_MS = 0.1
+    GROWTH = 1.05
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = defaultdict(int)
+        self.count = 0
+        self.max_ms = 0.0
+
+    def add(self, ms: float) -> None:
+        index = 0 if ms <= self.BASE_MS else int(math.log(ms / self.BASE_MS, self.GROWTH))
+        self.buckets[index] += 1
+        self.count += 1
+        self.max_ms = max(self.max_ms, ms)
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        for index, count in other.buckets.items():
+            self.buckets[index] += count
+        self.count += other.count
+        self.max_ms = max(self.max_ms, other.max_ms)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = math.ceil(self.count * pct / 100)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(self.BASE_MS * self.GROWTH ** (index + 1), self.max_ms)
+        return self.max_ms
+
+
+class RouteStats:
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.requests = 0
+        self.errors = 0
+        self.shed = 0
+
+    def merge(self, other: "RouteStats") -> None:
+        self.latency.merge(other.latency)
+        self.requests += other.requests
+        self.errors += other.errors
+        self.shed += other.shed
+
+    def summary(self) -> Dict[str, object]:
+        def rounded(value):
+            return None if value is None else round(value, 1)
+
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "shed": self.shed,
+            "error_rate": round(self.errors / self.requests, 4) if self.requests else 0.0,
+            "p50_ms": rounded(self.latency.percentile(50)),
+            "p95_ms": rounded(self.latency.percentile(95)),
+            "p99_ms": rounded(self.latency.percentile(99)),
+            "max_ms": rounded(self.latency.max_ms),
+        }
+
+
+class LoadStats:
+    """Per-route counters for the current report interval and the whole run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._interval = defaultdict(RouteStats)
+        self.total = defaultdict(RouteStats)
+        self.jobs_completed = 0
+        self.jobs_failed = 0
+        self.vins_submitted = 0
+
+    def record(self, route: str, ms: float, status: Optional[int]) -> None:
+        with self._lock:
+            stats = self._interval[route]
+            stats.requests += 1
+            stats.latency.add(ms)
+            if status in (429, 503):
+                stats.shed += 1
+            elif status is None or status >= 500:
+                stats.errors += 1
+
+    def job_finished(self, ok: bool, vins: int) -> None:
+        with self._lock:
+            if ok:
+                self.jobs_completed += 1
+                self.vins_submitted += vins
+            else:
+                self.jobs_failed += 1
+
+    def roll_interval(self) -> Dict[str, RouteStats]:
+        with self._lock:
+            interval, self._interval = self._interval, defaultdict(RouteStats)
+            for route, stats in interval.items():
+                self.total[route].merge(stats)
+        return interval
+
+
+class StubUpstreamHandler(BaseHTTPRequestHandler):
+    """Answers ``/api/vehicles/decodevin/<VIN>`` like vPIC, with configurable latency and failures."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        time.sleep(server.latency_seconds * random.uniform(0.5, 1.5))
+        vin = urlparse(self.path).path.rstrip("/").rsplit("/", 1)[-1].upper()
+        if server.error_rate and random.random() < server.error_rate:
+            self._send(503, b'{"Message": "stub failure"}')
+            return
+
+        make, model, vehicle_type, body, cylinders = STUB_VEHICLES[zlib.crc32(vin.encode()) % len(STUB_VEHICLES)]
+        variables = {
+            "Make": make,
+            "Model": model,
+            "Model Year": str(2005 + zlib.crc32(vin[::-1].encode()) % 20),
+            "Vehicle Type": vehicle_type,
+            "Body Class": body,
+            "Engine Number of Cylinders": cylinders,
+            "Manufacturer Name": f"{make} (STUB)",
+            "Error Code": "0",
+        }
+        results = [{"Variable": name, "Value": value} for name, value in variables.items()]
+        self._send(200, json.dumps({"Count": len(results), "SearchCriteria": f"VIN:{vin}", "Results": results}).encode())
+
+    def _send(self, status: int, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubUpstreamServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # The app dropping a connection (timeout, shutdown) is not a stub failure.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def start_stub_upstream(latency_ms: float = 80, error_rate: float = 0.0):
+    """Serve the stub on a free local port in a daemon thread; return ``(server, base_url)``."""
+    server = StubUpstreamServer(("127.0.0.1", 0), StubUpstreamHandler)
+    server.latency_seconds = latency_ms / 1000
+    server.error_rate = error_rate
+    threading.Thread(target=server.serve_forever, name="stub-upstream", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/api/vehicles/decodevin/"
+
+
+def free_port() -> int:
+    import socket
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def server_command(server: str, port: int, workers: int, threads: int) -> List[str]:
+    if server == "gunicorn":
+        return [
+            sys.executable, "-m", "gunicorn",
+            "--workers", str(workers),
+            "--threads", str(threads),
+            "--timeout", "120",
+            "--bind", f"127.0.0.1:{port}",
+            "vin_decoder:app",
+        ]
+    return [
+        sys.executable, "-m", "flask", "--app", "vin_decoder:app",
+        "run", "--host", "127.0.0.1", "--port", str(port), "--with-threads", "--no-reload", "--no-debugger",
+    ]
+
+
+def server_environment(run_dir: Path, upstream_base: str, args) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update(
+        {
+            "VIN_DECODER_ENV": "production",
+            "VIN_DECODER_UPLOAD_DIR": str(run_dir / "uploads"),
+            "VIN_DECODER_DATA_DIR": str(run_dir / "data"),
+            "VIN_DECODER_LOG_DIR": str(run_dir / "logs"),
+            "VIN_DECODER_DB_PATH": str(run_dir / "data" / "vin_decoder.sqlite3"),
+            "VIN_DECODER_NHTSA_API_BASE": upstream_base,
+            "VIN_DECODER_RATE_LIMIT_STORAGE_URI": "sqlite://",
+            "VIN_DECODER_DEFAULT_RATE_LIMIT": args.rate_limit,
+            "PYTHONUNBUFFERED": "1",
+        }
+    )
+    return env
+
+
+def process_tree_rss(root_pid: int) -> Optional[int]:
+    """Resident bytes of ``root_pid`` and all its descendants, from ``/proc``; ``None`` elsewhere."""
+    proc = Path("/proc")
+    if not proc.is_dir():
+        return None
+
+    children = defaultdict(list)
+    for entry in proc.iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+        except OSError:
+            continue
+        # The command name may contain spaces; fields after it are fixed.
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        children[ppid].append(int(entry.name))
+
+    total = 0
+    pending = [root_pid]
+    while pending:
+        pid = pending.pop()
+        pending.extend(children.get(pid, ()))
+        try:
+            for line in (proc / str(pid) / "status").read_text().splitlines():
+                if line.startswith("VmRSS:"):
+                    total += int(line.split()[1]) * 1024
+                    break
+        except OSError:
+            continue
+    return total
+
+
+class LogWatcher:
+    """Counts "database is locked" in the server log as it grows."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.offset = 0
+        self.tail = b""
+        self.locked = 0
+
+    def poll(self) -> int:
+        try:
+            with open(self.path, "rb") as handle:
+                handle.seek(self.offset)
+                data = handle.read()
+        except OSError:
+            return self.locked
+        self.offset += len(data)
+        data = self.tail + data
+        cut = data.rfind(b"\n") + 1
+        self.locked += len(LOCKED_PATTERN.findall(data[:cut]))
+        self.tail = data[cut:]
+        return self.locked
+
+
+def random_vin(rng: random.Random) -> str:
+    return "".join(rng.choice(VIN_CHARS) for _ in range(17))
+
+
+def build_upload(vins: List[str], upload_format: str):
+    if upload_format == "xlsx":
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("Fleet")
+        sheet.append(["Unit", "VIN"])
+        for number, vin in enumerate(vins, start=1):
+            sheet.append([f"U-{number}", vin])
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        return "fleet.xlsx", buffer.getvalue()
+
+    lines = ["Unit,VIN"] + [f"U-{number},{vin}" for number, vin in enumerate(vins, start=1)]
+    return "fleet.csv", ("\n".join(lines) + "\n").encode()
+
+
+class VirtualUser(threading.Thread):
+    """Upload, poll until done, download, think, repeat."""
+
+    def __init__(self, number: int, base_url: str, stats: LoadStats, stop: threading.Event, shared_vins: List[str], args):
+        super().__init__(name=f"vu-{number}", daemon=True)
+        self.base_url = base_url
+        self.stats = stats
+        self.stop = stop
+        self.shared_vins = shared_vins
+        self.args = args
+        self.rng = random.Random(args.seed * 1000 + number)
+        self.session = requests.Session()
+
+    def request(self, route: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + url, timeout=self.args.request_timeout, **kwargs)
+            if kwargs.get("stream"):
+                for _ in response.iter_content(64 * 1024):
+                    pass
+        except requests.RequestException:
+            self.stats.record(route, (time.perf_counter() - started) * 1000, None)
+            return None
+        self.stats.record(route, (time.perf_counter() - started) * 1000, response.status_code)
+        return response
+
+    def backoff(self, response) -> None:
+        try:
+            wait = float(response.headers.get("Retry-After", 5))
+        except (TypeError, ValueError):
+            wait = 5
+        self.stop.wait(min(wait, 30) * self.rng.uniform(0.8, 1.2))
+
+    def run(self):
+        # Stagger start-up so users do not upload in lockstep.
+        self.stop.wait(self.rng.uniform(0, self.args.ramp_up))
+        while not self.stop.is_set():
+            self.run_once()
+            self.stop.wait(self.rng.uniform(0, 2 * self.args.think_time))
+
+    def run_once(self) -> None:
+        count = max(1, int(self.rng.gauss(self.args.vins_per_upload, self.args.vins_per_upload / 4)))
+        vins = [
+            self.rng.choice(self.shared_vins) if self.rng.random() < self.args.repeat_ratio else random_vin(self.rng)
+            for _ in range(count)
+        ]
+        filename, body = build_upload(vins, self.args.upload_format)
+        response = self.request(
+            "upload",
+            "POST",
+            "/",
+            files={"file": (filename, body)},
+            data={"profile": self.args.profile},
+            allow_redirects=False,
+        )
+        if response is None or response.status_code != 302:
+            if response is not None and response.status_code in (429, 503):
+                self.backoff(response)
+            return
+
+        job_id = response.headers["Location"].rstrip("/").rsplit("/", 1)[-1]
+        deadline = time.monotonic() + self.args.job_timeout
+        while not self.stop.is_set():
+            response = self.request("status", "GET", f"/status/{job_id}")
+            payload = None
+            if response is not None and response.status_code == 200:
+                payload = response.json()
+            if payload and (payload.get("completed") or payload.get("error")):
+                break
+            if time.monotonic() > deadline:
+                self.stats.job_finished(False, count)
+                return
+            self.stop.wait(self.args.poll_interval)
+        else:
+            return
+
+        if payload.get("error"):
+            self.stats.job_finished(False, count)
+            return
+        response = self.request("download", "GET", f"/download/{job_id}", stream=True)
+        self.stats.job_finished(response is not None and response.status_code == 200, count)
+
+
+def wait_until_ready(base_url: str, process: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode} before it was ready")
+        try:
+            if requests.get(base_url + "/status", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError("server did not become ready in time")
+
+
+def format_ms(value) -> str:
+    return "-" if value is None else f"{value:.0f}"
+
+
+def format_routes(routes: Dict[str, RouteStats], seconds: float) -> str:
+    parts = []
+    for route in ROUTES:
+        stats = routes.get(route)
+        if not stats or not stats.requests:
+            continue
+        summary = stats.summary()
+        parts.append(
+            f"{route} {stats.requests / seconds:.1f}/s "
+            f"p50={format_ms(summary['p50_ms'])} p95={format_ms(summary['p95_ms'])} p99={format_ms(summary['p99_ms'])}ms "
+            f"err={stats.errors} shed={stats.shed}"
+        )
+    return " | ".join(parts) or "no requests"
+
+
+MIN_TREND_SECONDS = 600
+
+
+def memory_growth_mb_per_hour(samples) -> Optional[float]:
+    """Least-squares slope of RSS over time, skipping the first fifth of the run as warm-up.
+
+    Runs shorter than ``MIN_TREND_SECONDS`` have no trend: start-up growth would dominate.
+    """
+    usable = [(t, rss) for t, rss in samples[len(samples) // 5:] if rss is not None]
+    if len(usable) < 3 or usable[-1][0] - usable[0][0] < MIN_TREND_SECONDS:
+        return None
+    mean_t = sum(t for t, _ in usable) / len(usable)
+    mean_rss = sum(rss for _, rss in usable) / len(usable)
+    var_t = sum((t - mean_t) ** 2 for t, _ in usable)
+    if not var_t:
+        return None
+    slope = sum((t - mean_t) * (rss - mean_rss) for t, rss in usable) / var_t
+    return slope * 3600 / (1024 * 1024)
+
+
+def run(args) -> Dict[str, object]:
+    run_dir = Path(args.run_dir or tempfile.mkdtemp(prefix="vin-loadtest-")).resolve()
+    for name in ("uploads", "data", "logs"):
+        (run_dir / name).mkdir(parents=True, exist_ok=True)
+    server_log = run_dir / "logs" / "server.log"
+
+    upstream, upstream_base = start_stub_upstream(args.upstream_latency_ms, args.upstream_error_rate)
+    port = args.port or free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    command = server_command(args.server, port, args.workers, args.threads)
+    print(f"run dir: {run_dir}")
+    print(f"server:  {' '.join(command)}")
+
+    with open(server_log, "ab") as log_handle:
+        process = subprocess.Popen(
+            command,
+            cwd=str(PROJECT_ROOT),
+            env=server_environment(run_dir, upstream_base, args),
+            stdout=log_handle,
+            stderr=subprocess.STDOUT,
+        )
+    stats = LoadStats()
+    stop = threading.Event()
+    log_watcher = LogWatcher(server_log)
+    memory_samples = []
+    interrupted = []
+    previous_sigint = signal.signal(signal.SIGINT, lambda *_: (interrupted.append(True), stop.set()))
+
+    try:
+        wait_until_ready(base_url, process)
+        started = time.monotonic()
+        memory_samples.append((0.0, process_tree_rss(process.pid)))
+
+        seed_rng = random.Random(args.seed)
+        shared_vins = [random_vin(seed_rng) for _ in range(args.shared_vin_pool)]
+        users = [VirtualUser(number, base_url, stats, stop, shared_vins, args) for number in range(args.users)]
+        for user in users:
+            user.start()
+
+        last_report = started
+        while not stop.wait(min(args.report_interval, max(0.1, started + args.duration - time.monotonic()))):
+            now = time.monotonic()
+            interval = stats.roll_interval()
+            rss = process_tree_rss(process.pid)
+            memory_samples.append((now - started, rss))
+            locked = log_watcher.poll()
+            rss_text = "-" if rss is None else f"{rss / 1024 / 1024:.0f}MB"
+            print(
+                f"[{now - started:7.0f}s] {format_routes(interval, now - last_report)} | "
+                f"jobs={stats.jobs_completed} locked={locked} rss={rss_text}",
+                flush=True,
+            )
+            last_report = now
+            if process.poll() is not None:
+                print(f"server exited with code {process.returncode}", file=sys.stderr)
+                break
+            if now - started >= args.duration:
+                break
+        stop.set()
+        for user in users:
+            user.join(timeout=args.request_timeout + 5)
+        elapsed = time.monotonic() - started
+    finally:
+        stop.set()
+        signal.signal(signal.SIGINT, previous_sigint)
+        if process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        upstream.shutdown()
+
+    stats.roll_interval()
+    rss_values = [rss for _, rss in memory_samples if rss is not None]
+    growth = memory_growth_mb_per_hour(memory_samples)
+    summary = {
+        "server": args.server,
+        "workers": args.workers,
+        "users": args.users,
+        "duration_seconds": round(elapsed, 1),
+        "interrupted": bool(interrupted),
+        "routes": {route: stats.total[route].summary() for route in ROUTES if route in stats.total},
+        "jobs_completed": stats.jobs_completed,
+        "jobs_failed": stats.jobs_failed,
+        "vins_per_second": round(stats.vins_submitted / elapsed, 2) if elapsed else 0.0,
+        "database_locked": log_watcher.poll(),
+        "rss_start_mb": round(rss_values[0] / 1024 / 1024, 1) if rss_values else None,
+        "rss_end_mb": round(rss_values[-1] / 1024 / 1024, 1) if rss_values else None,
+        "rss_peak_mb": round(max(rss_values) / 1024 / 1024, 1) if rss_values else None,
+        "rss_growth_mb_per_hour": None if growth is None else round(growth, 2),
+        "run_dir": str(run_dir),
+    }
+    if not args.keep_run_dir:
+        shutil.rmtree(run_dir / "uploads", ignore_errors=True)
+    return summary
+
+
+def print_summary(summary: Dict[str, object]) -> None:
+    print()
+    server = summary["server"]
+    if server == "gunicorn":
+        server += f" ({summary['workers']} workers)"
+    print(f"{summary['users']} users for {summary['duration_seconds']:.0f}s on {server}")
+    print(f"{'route':<10}{'requests':>10}{'errors':>8}{'shed':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for route, route_summary in summary["routes"].items():
+        print(
+            f"{route:<10}{route_summary['requests']:>10}{route_summary['errors']:>8}{route_summary['shed']:>7}"
+            f"{format_ms(route_summary['p50_ms']):>9}{format_ms(route_summary['p95_ms']):>9}"
+            f"{format_ms(route_summary['p99_ms']):>9}{format_ms(route_summary['max_ms']):>9}"
+        )
+    print(
+        f"jobs: {summary['jobs_completed']} completed, {summary['jobs_failed']} failed, "
+        f"{summary['vins_per_second']} VINs/s"
+    )
+    print(f"'database is locked' in server log: {summary['database_locked']}")
+    if summary["rss_start_mb"] is not None:
+        growth = summary["rss_growth_mb_per_hour"]
+        print(
+            f"server RSS: {summary['rss_start_mb']}MB -> {summary['rss_end_mb']}MB "
+            f"(peak {summary['rss_peak_mb']}MB, trend {'-' if growth is None else f'{growth:+.1f}MB/h'})"
+        )
+    print(f"server log: {Path(summary['run_dir']) / 'logs' / 'server.log'}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    try:
+        import gunicorn  # noqa: F401
+
+        default_server = "gunicorn"
+    except ImportError:
+        default_server = "werkzeug"
+
+    parser = argparse.ArgumentParser(description="Load and soak test the VIN decoder over HTTP.")
+    parser.add_argument("--users", type=int, default=50, help="concurrent virtual users")
+    parser.add_argument("--duration", type=parse_duration, default=parse_duration("5m"), help="run length, e.g. 600, 15m, 4h")
+    parser.add_argument("--ramp-up", type=parse_duration, default=30, help="spread user start-up over this many seconds")
+    parser.add_argument("--report-interval", type=parse_duration, default=30, help="seconds between report lines")
+    parser.add_argument("--server", choices=("gunicorn", "werkzeug"), default=default_server)
+    parser.add_argument("--workers", type=int, default=4, help="Gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=1, help="threads per Gunicorn worker")
+    parser.add_argument("--port", type=int, default=0, help="app port (default: a free one)")
+    parser.add_argument("--vins-per-upload", type=int, default=50, help="mean VINs per uploaded file")
+    parser.add_argument("--repeat-ratio", type=float, default=0.5, help="share of VINs drawn from a shared pool, to exercise the cache")
+    parser.add_argument("--shared-vin-pool", type=int, default=2000)
+    parser.add_argument("--upload-format", choices=("csv", "xlsx"), default="csv")
+    parser.add_argument("--profile", default="essentials", help="field profile requested for every job")
+    parser.add_argument("--poll-interval", type=float, default=3.0, help="seconds between status polls, like the status page")
+    parser.add_argument("--think-time", type=float, default=5.0, help="mean pause between a user's jobs")
+    parser.add_argument("--job-timeout", type=parse_duration, default=parse_duration("15m"))
+    parser.add_argument("--request-timeout", type=float, default=60.0)
+    parser.add_argument("--upstream-latency-ms", type=float, default=80.0, help="mean stub vPIC response time")
+    parser.add_argument("--upstream-error-rate", type=float, default=0.0, help="share of stub responses that are 503s")
+    parser.add_argument("--rate-limit", default="1000000 per minute", help="app rate limit during the run")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--run-dir", help="directory for the app's database and logs (default: a new temp dir)")
+    parser.add_argument("--keep-run-dir", action="store_true", help="keep uploads and outputs after the run")
+    parser.add_argument("--json", help="also write the summary to this file")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    summary = run(args)
+    print_summary(summary)
+    if args.json:
+        Path(args.json).write_text(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
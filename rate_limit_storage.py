@@ -0,0 +1,136 @@
+"""SQLite-backed rate limit storage shared by every Gunicorn worker.
+
+Importing this module registers the ``sqlite://`` scheme with the ``limits``
+package, so Flask-Limiter can use it like any built-in backend::
+
+    VIN_DECODER_RATE_LIMIT_STORAGE_URI=sqlite:////home/pi/VIN_decoder/data/rate_limits.sqlite3
+
+The app also accepts a bare ``sqlite://`` and keeps the counters in a file
+next to its own database. Only the fixed-window strategy (Flask-Limiter's
+default) is supported.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import unquote, urlparse
+
+from limits.storage import Storage
+
+PURGE_EVERY_N_WRITES = 500
+
+
+def sqlite_path_from_uri(uri: str) -> str:
+    """Map a ``sqlite://`` URI to a filesystem path.
+
+    Follows the SQLAlchemy convention: three slashes for a relative path,
+    four for an absolute one (``sqlite:///C:/...`` on Windows).
+    """
+    parsed = urlparse(uri)
+    path = parsed.netloc + (parsed.path[1:] if not parsed.netloc else parsed.path)
+    path = unquote(path)
+    if not path:
+        raise ValueError(f"rate limit storage URI has no database path: {uri}")
+    return path
+
+
+class SQLiteStorage(Storage):
+    """Fixed-window counters kept in one SQLite table.
+
+    Each increment is a single upsert inside ``BEGIN IMMEDIATE``, so counts
+    stay exact across processes without any extra service. Connections are
+    per thread and per process, which keeps the storage safe to use after
+    Gunicorn forks its workers.
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, timeout: float = 10, **options):
+        self.path = sqlite_path_from_uri(uri)
+        self.timeout = timeout
+        self._local = threading.local()
+        self._writes = 0
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self._ensure_schema()
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("PRAGMA synchronous=NORMAL;")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _ensure_schema(self) -> None:
+        conn = self._connection()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                key TEXT PRIMARY KEY,
+                count INTEGER NOT NULL,
+                expires_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_rate_limits_expires_at ON rate_limits (expires_at)")
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                """
+                INSERT INTO rate_limits (key, count, expires_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    count = CASE WHEN expires_at <= ? THEN excluded.count ELSE count + excluded.count END,
+                    expires_at = CASE WHEN expires_at <= ? THEN excluded.expires_at ELSE expires_at END
+                """,
+                (key, amount, now + expiry, now, now),
+            )
+            count = conn.execute("SELECT count FROM rate_limits WHERE key = ?", (key,)).fetchone()[0]
+
+            self._writes += 1
+            if self._writes % PURGE_EVERY_N_WRITES == 0:
+                conn.execute("DELETE FROM rate_limits WHERE expires_at <= ?", (now,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return count
+
+    def get(self, key: str) -> int:
+        row = self._connection().execute(
+            "SELECT count FROM rate_limits WHERE key = ? AND expires_at > ?",
+            (key, time.time()),
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        now = time.time()
+        row = self._connection().execute(
+            "SELECT expires_at FROM rate_limits WHERE key = ? AND expires_at > ?",
+            (key, now),
+        ).fetchone()
+        return row[0] if row else now
+
+    def check(self) -> bool:
+        try:
+            self._connection().execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> int:
+        return self._connection().execute("DELETE FROM rate_limits").rowcount
+
+    def clear(self, key: str) -> None:
+        self._connection().execute("DELETE FROM rate_limits WHERE key = ?", (key,))
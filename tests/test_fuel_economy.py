@@ -0,0 +1,71 @@
+import os
+import sys
+import tempfile
+import unittest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from fuel_economy import FuelEconomyIndex, load_fuel_economy_index
+
+SNAPSHOT = """make,model,baseModel,year,city08,highway08,comb08
+Honda,Accord,Accord,2003,21,30,24
+Honda,Accord,Accord,2003,19,27,22
+Honda,Accord Wagon,Accord,2003,20,28,23
+Ford,F150 Pickup 2WD,F150 Pickup,2013,17,23,19
+Ford,F150 Pickup 4WD,F150 Pickup,2013,15,21,17
+Toyota,Prius,Prius,2011,51,48,50
+Toyota,Camry Hybrid,Camry,2011,31,35,33
+Toyota,Camry,Camry,2011,22,33,26
+Ford,Transit Connect Van FWD,Transit Connect,2013,21,27,23
+Ford,Transit Custom,Transit Custom,2013,18,24,20
+Honda,Civic Hybrid,Civic,2012,44,44,44
+Toyota,Broken,Broken,2011,n/a,,
+"""
+
+
+class FuelEconomyIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.temp_dir.name, "vehicles.csv")
+        with open(self.csv_path, "w", encoding="utf-8") as handle:
+            handle.write(SNAPSHOT)
+        self.index = FuelEconomyIndex.from_csv(self.csv_path)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_variants_are_averaged(self):
+        self.assertEqual(
+            self.index.get_mpg("HONDA", "Accord", "2003"),
+            {"MPG City": 20, "MPG Highway": 28, "MPG Combined": 23},
+        )
+
+    def test_model_names_match_loosely(self):
+        self.assertEqual(self.index.get_mpg("FORD", "F-150", 2013)["MPG Combined"], 18)
+        self.assertEqual(self.index.get_mpg("TOYOTA", "Pruis", 2011)["MPG City"], 51)
+
+    def test_hybrids_and_longer_model_names_are_not_merged(self):
+        self.assertEqual(self.index.get_mpg("TOYOTA", "Camry Hybrid", 2011)["MPG City"], 31)
+        self.assertEqual(self.index.get_mpg("TOYOTA", "Camry", 2011)["MPG City"], 22)
+        self.assertEqual(self.index.get_mpg("HONDA", "Civic", 2012)["MPG City"], "No Data")
+        self.assertEqual(self.index.get_mpg("FORD", "Transit Connect", 2013)["MPG City"], 21)
+        self.assertEqual(self.index.get_mpg("FORD", "Transit", 2013)["MPG City"], "No Data")
+
+    def test_unknown_vehicles_have_no_data(self):
+        self.assertEqual(self.index.get_mpg("TOYOTA", "Broken", 2011)["MPG City"], "No Data")
+        self.assertEqual(self.index.get_mpg("HONDA", "Accord", "Not Found")["MPG City"], "No Data")
+        self.assertEqual(self.index.get_mpg("HONDA", "Civic", 2003)["MPG City"], "No Data")
+
+    def test_lookups_are_memoized(self):
+        self.index.get_mpg("FORD", "F-150", 2013)
+        self.index.get_mpg("Ford", "F 150", "2013")
+        self.assertEqual(self.index.lookup.cache_info().hits, 1)
+
+    def test_missing_snapshot_loads_nothing(self):
+        self.assertIsNone(load_fuel_economy_index(os.path.join(self.temp_dir.name, "missing.csv")))
+
+
+if __name__ == "__main__":
+    unittest.main()
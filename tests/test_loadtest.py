@@ -0,0 +1,60 @@
+import os
+import sys
+import tempfile
+import unittest
+
+import requests
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from loadtest import LatencyHistogram, LogWatcher, memory_growth_mb_per_hour, parse_duration, start_stub_upstream
+
+
+class LoadTestHelperTests(unittest.TestCase):
+    def test_histogram_percentiles_are_within_a_bucket(self):
+        histogram = LatencyHistogram()
+        for ms in range(1, 1001):
+            histogram.add(float(ms))
+        self.assertAlmostEqual(histogram.percentile(50), 500, delta=500 * 0.05)
+        self.assertAlmostEqual(histogram.percentile(99), 990, delta=990 * 0.05)
+        self.assertEqual(histogram.percentile(100), 1000)
+        self.assertIsNone(LatencyHistogram().percentile(50))
+
+    def test_parse_duration(self):
+        self.assertEqual(parse_duration("90"), 90)
+        self.assertEqual(parse_duration("15m"), 900)
+        self.assertEqual(parse_duration("4h"), 14400)
+
+    def test_memory_trend_needs_a_long_enough_run(self):
+        mb = 1024 * 1024
+        self.assertIsNone(memory_growth_mb_per_hour([(t, 100 * mb) for t in range(0, 60, 10)]))
+        samples = [(t, (100 + t / 360) * mb) for t in range(0, 3601, 300)]
+        self.assertAlmostEqual(memory_growth_mb_per_hour(samples), 10, places=3)
+
+    def test_log_watcher_counts_locked_errors_across_reads(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "server.log")
+            watcher = LogWatcher(path)
+            with open(path, "wb") as handle:
+                handle.write(b"sqlite3.OperationalError: database is locked\nsqlite3.OperationalError: database is")
+            self.assertEqual(watcher.poll(), 1)
+            with open(path, "ab") as handle:
+                handle.write(b" locked\nok\n")
+            self.assertEqual(watcher.poll(), 2)
+
+    def test_stub_upstream_answers_like_vpic(self):
+        server, base_url = start_stub_upstream(latency_ms=0)
+        try:
+            first = requests.get(f"{base_url}1HGCM82633A004352?format=json", timeout=5).json()
+            second = requests.get(f"{base_url}1HGCM82633A004352?format=json", timeout=5).json()
+        finally:
+            server.shutdown()
+        variables = {item["Variable"]: item["Value"] for item in first["Results"]}
+        self.assertIn(variables["Make"], {"HONDA", "FORD", "TOYOTA", "FREIGHTLINER", "RAM"})
+        self.assertEqual(first, second)
+
+
+if __name__ == "__main__":
+    unittest.main()
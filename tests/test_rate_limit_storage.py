@@ -0,0 +1,71 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from limits.storage import storage_from_string
+
+from config import TestingConfig
+from rate_limit_storage import SQLiteStorage
+from vin_decoder import create_app
+
+
+class SQLiteStorageTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.uri = f"sqlite:///{os.path.join(self.temp_dir.name, 'limits.sqlite3')}"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_scheme_is_registered(self):
+        self.assertIsInstance(storage_from_string(self.uri), SQLiteStorage)
+
+    def test_counts_are_shared_between_instances(self):
+        first = SQLiteStorage(self.uri)
+        second = SQLiteStorage(self.uri)
+
+        self.assertEqual(first.incr("client", 60), 1)
+        self.assertEqual(second.incr("client", 60), 2)
+        self.assertEqual(first.get("client"), 2)
+        self.assertGreater(second.get_expiry("client"), 0)
+
+        second.clear("client")
+        self.assertEqual(first.get("client"), 0)
+
+    def test_window_restarts_after_expiry(self):
+        storage = SQLiteStorage(self.uri)
+        with mock.patch("rate_limit_storage.time.time", return_value=1000.0):
+            storage.incr("client", 60)
+            storage.incr("client", 60)
+        with mock.patch("rate_limit_storage.time.time", return_value=1061.0):
+            self.assertEqual(storage.get("client"), 0)
+            self.assertEqual(storage.incr("client", 60), 1)
+            self.assertEqual(storage.get_expiry("client"), 1121.0)
+
+    def test_app_enforces_limit_with_sqlite_storage(self):
+        app = create_app(
+            config_class=TestingConfig,
+            overrides={
+                "UPLOAD_DIR": os.path.join(self.temp_dir.name, "uploads"),
+                "DATA_DIR": os.path.join(self.temp_dir.name, "data"),
+                "LOG_DIR": os.path.join(self.temp_dir.name, "logs"),
+                "DB_PATH": os.path.join(self.temp_dir.name, "app.sqlite3"),
+                "DEFAULT_RATE_LIMIT": "2 per minute",
+                "RATE_LIMIT_STORAGE_URI": "sqlite://",
+            },
+        )
+        client = app.test_client()
+
+        statuses = [client.get("/").status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir.name, "data", "rate_limits.sqlite3")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,12 @@
+import hashlib
 import io
+import json
 import os
+import sqlite3
 import sys
 import tempfile
+import threading
+import time
 import unittest
 from unittest import mock
 
@@ -9,8 +14,23 @@ PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
+import vin_decoder
 from config import TestingConfig
-from vin_decoder import create_app
+from vin_decoder import (
+    SCHEMA_MIGRATIONS,
+    JobScheduler,
+    _ScheduledJob,
+    create_job_record,
+    decode_vin,
+    resolve_field_selection,
+    save_job_results,
+    create_app,
+    get_cached_vin_data,
+    get_job_record,
+    hash_vin_set,
+    run_cleanup,
+    update_job_record,
+)
 
 
 class VinDecoderTests(unittest.TestCase):
@@ -40,6 +60,10 @@ class VinDecoderTests(unittest.TestCase):
     def tearDown(self):
         self.temp_dir.cleanup()
 
+    def test_importing_the_module_builds_no_default_app(self):
+        # Spawned parse processes re-import the main script; they must not start an app.
+        self.assertNotIn("app", vars(vin_decoder))
+
     def test_download_template_route(self):
         response = self.client.get("/download-template")
         self.assertEqual(response.status_code, 200)
@@ -53,10 +77,8 @@ class VinDecoderTests(unittest.TestCase):
         self.assertIn("error", payload)
         self.assertIn("completed", payload)
 
-    @mock.patch("vin_decoder.threading.Thread")
-    def test_upload_creates_job_and_redirects(self, thread_cls):
-        thread_cls.return_value.start.return_value = None
-
+    @mock.patch("vin_decoder.JobScheduler.submit")
+    def test_upload_creates_job_and_redirects(self, submit):
         csv_bytes = io.BytesIO(b"VIN,Label\n1HGCM82633A004352,Example\n")
         response = self.client.post(
             "/",
@@ -67,6 +89,263 @@ class VinDecoderTests(unittest.TestCase):
 
         self.assertEqual(response.status_code, 302)
         self.assertIn("/jobs/", response.headers["Location"])
+        submit.assert_called_once()
+
+    @mock.patch("vin_decoder.JobScheduler.submit")
+    def test_repeat_upload_reuses_completed_result(self, submit):
+        first = self.client.post(
+            "/",
+            data={"file": (io.BytesIO(b"VIN\n1HGCM82633A004352\n2T3ZF4DV8BW073893\n"), "fleet.csv")},
+            content_type="multipart/form-data",
+        )
+        first_job_id = first.headers["Location"].rsplit("/", 1)[-1]
+        open(os.path.join(self.upload_dir, "decoded_first.xlsx"), "wb").close()
+        with self.app.app_context():
+            update_job_record(
+                first_job_id,
+                status="completed",
+                completed=True,
+                output_file="decoded_first.xlsx",
+                completed_at=get_job_record(first_job_id)["created_at"],
+            )
+
+        # Same VINs, different order and layout: matched on the normalized VIN set.
+        second = self.client.post(
+            "/",
+            data={"file": (io.BytesIO(b"Unit,VIN\nB,2t3zf4dv8bw073893\nA,1HGCM82633A004352\n"), "copy.csv")},
+            content_type="multipart/form-data",
+        )
+        second_job_id = second.headers["Location"].rsplit("/", 1)[-1]
+        payload = self.client.get(f"/status/{second_job_id}").get_json()
+
+        submit.assert_called_once()
+        self.assertEqual(payload["status"], "completed")
+        self.assertEqual(payload["reused_from"], first_job_id)
+        self.assertEqual(payload["file"], "decoded_first.xlsx")
+
+    def _upload_completed_fleet(self, lookup_errors=0):
+        response = self.client.post(
+            "/",
+            data={"file": (io.BytesIO(b"VIN\n1HGCM82633A004352\n"), "fleet.csv")},
+            content_type="multipart/form-data",
+        )
+        job_id = response.headers["Location"].rsplit("/", 1)[-1]
+        open(os.path.join(self.upload_dir, f"decoded_{job_id}.xlsx"), "wb").close()
+        with self.app.app_context():
+            save_job_results([(job_id, 0, {"VIN": "1HGCM82633A004352", "Make": "HONDA"})])
+            update_job_record(
+                job_id,
+                status="completed",
+                completed=True,
+                output_file=f"decoded_{job_id}.xlsx",
+                completed_at=get_job_record(job_id)["created_at"],
+                lookup_errors=lookup_errors,
+            )
+        return job_id
+
+    @mock.patch("vin_decoder.JobScheduler.submit")
+    def test_reuse_of_a_reused_job_points_at_the_original(self, submit):
+        original_job_id = self._upload_completed_fleet()
+        second = self.client.post(
+            "/",
+            data={"file": (io.BytesIO(b"VIN\n1HGCM82633A004352\n"), "fleet.csv")},
+            content_type="multipart/form-data",
+        )
+        second_job_id = second.headers["Location"].rsplit("/", 1)[-1]
+        with self.app.app_context():
+            # Make the reused job the newest match for the third upload.
+            update_job_record(second_job_id, completed_at="9999-12-31 00:00:00")
+        third = self.client.post(
+            "/",
+            data={"file": (io.BytesIO(b"VIN\n1HGCM82633A004352\n"), "fleet.csv")},
+            content_type="multipart/form-data",
+        )
+        third_job_id = third.headers["Location"].rsplit("/", 1)[-1]
+
+        submit.assert_called_once()
+        self.assertEqual(self.client.get(f"/status/{third_job_id}").get_json()["reused_from"], original_job_id)
+        results = self.client.get(f"/jobs/{third_job_id}/results").get_json()
+        self.assertEqual([row["Make"] for row in results["rows"]], ["HONDA"])
+
+    @mock.patch("vin_decoder.JobScheduler.submit")
+    def test_jobs_with_lookup_errors_are_not_reused(self, submit):
+        self._upload_completed_fleet(lookup_errors=1)
+        response = self.client.post(
+            "/",
+            data={"file": (io.BytesIO(b"VIN\n1HGCM82633A004352\n"), "fleet.csv")},
+            content_type="multipart/form-data",
+        )
+        job_id = response.headers["Location"].rsplit("/", 1)[-1]
+
+        self.assertEqual(submit.call_count, 2)
+        self.assertIsNone(self.client.get(f"/status/{job_id}").get_json()["reused_from"])
+
+    def test_hash_vin_set_ignores_order_and_case(self):
+        self.assertEqual(
+            hash_vin_set(["1HGCM82633A004352", "2t3zf4dv8bw073893"]),
+            hash_vin_set(["2T3ZF4DV8BW073893", "1hgcm82633a004352", "1HGCM82633A004352"]),
+        )
+
+    @mock.patch("vin_decoder.JobScheduler.submit")
+    def test_upload_accepts_explicit_field_list(self, submit):
+        response = self.client.post(
+            "/",
+            data={
+                "file": (io.BytesIO(b"VIN\n1HGCM82633A004352\n"), "fleet.csv"),
+                "profile": "essentials",
+                "fields": "make, Model Year",
+            },
+            content_type="multipart/form-data",
+        )
+        job_id = response.headers["Location"].rsplit("/", 1)[-1]
+
+        self.assertEqual(submit.call_args.args[2], ["Make", "Model Year", "VIN"])
+        self.assertEqual(self.client.get(f"/status/{job_id}").get_json()["fields"], ["Make", "Model Year", "VIN"])
+
+    def test_upload_rejects_unknown_fields(self):
+        response = self.client.post(
+            "/",
+            data={"file": (io.BytesIO(b"VIN\n1HGCM82633A004352\n"), "fleet.csv"), "fields": "Make, Colour"},
+            content_type="multipart/form-data",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"Unknown field(s): Colour", response.data)
+
+    def test_decode_vin_projects_requested_columns(self):
+        payload = {"Make": "HONDA", "Model": "Accord", "Model Year": "2003", "Trim": "EX"}
+        with self.app.app_context(), mock.patch("vin_decoder.get_vin_data", return_value=payload), mock.patch(
+            "vin_decoder.get_mpg"
+        ) as get_mpg:
+            row = decode_vin("1HGCM82633A004352", ["Make", "Model Year", "VIN"])
+            self.assertEqual(resolve_field_selection("Essentials")[:3], ["Make", "Model", "Model Year"])
+
+        self.assertEqual(row, {"Make": "HONDA", "Model Year": "2003", "VIN": "1HGCM82633A004352"})
+        get_mpg.assert_not_called()
+
+    def test_upload_is_shed_when_backlog_is_full(self):
+        self.app.extensions["vin_decoder_admission"].max_queued_vins = 5
+        with self.app.app_context():
+            create_job_record("busy", "big.csv", None, 10)
+
+        with mock.patch("vin_decoder.save_upload") as save_upload, mock.patch(
+            "flask.wrappers.Request._load_form_data"
+        ) as load_form_data:
+            response = self.client.post(
+                "/",
+                data={"file": (io.BytesIO(b"VIN\n1HGCM82633A004352\n"), "fleet.csv")},
+                content_type="multipart/form-data",
+            )
+
+        # Rejected before the multipart body was parsed, let alone saved.
+        load_form_data.assert_not_called()
+        save_upload.assert_not_called()
+        self.assertEqual(response.status_code, 503)
+        self.assertGreaterEqual(int(response.headers["Retry-After"]), 5)
+        self.assertIn(b"10 VINs are queued ahead of you", response.data)
+        self.assertEqual(os.listdir(self.upload_dir), [])
+
+    def test_upload_gets_429_when_parse_slots_are_taken(self):
+        admission = self.app.extensions["vin_decoder_admission"]
+        admission.parse_slot_wait_seconds = 0.01
+        with admission.parse_slot(0):
+            with admission.parse_slot(0):
+                response = self.client.post(
+                    "/",
+                    data={"file": (io.BytesIO(b"VIN\n1HGCM82633A004352\n"), "fleet.csv")},
+                    content_type="multipart/form-data",
+                )
+
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response.headers)
+
+    def _put_part(self, upload_id, number, data, checksum=None):
+        return self.client.put(
+            f"/uploads/{upload_id}/parts/{number}",
+            data=data,
+            headers={"X-Part-SHA256": checksum or hashlib.sha256(data).hexdigest()},
+        )
+
+    @mock.patch("vin_decoder.JobScheduler.submit")
+    def test_chunked_upload_resumes_and_parses_before_last_part(self, submit):
+        body = b"Unit,VIN\nT-1,1HGCM82633A004352\nT-2,2T3ZF4DV8BW073893\nT-3,1hgcm82633a004352\n"
+        parts = [body[:20], body[20:45], body[45:]]
+        created = self.client.post("/uploads", json={"filename": "fleet.csv", "total_parts": 3, "profile": "essentials"})
+        self.assertEqual(created.status_code, 201)
+        upload_id = created.get_json()["upload_id"]
+
+        self.assertEqual(self._put_part(upload_id, 2, parts[1]).get_json()["assembled_parts"], 0)
+        self.assertEqual(self._put_part(upload_id, 3, parts[2], checksum="0" * 64).status_code, 422)
+        state = self._put_part(upload_id, 1, parts[0]).get_json()
+        self.assertEqual(state["assembled_parts"], 2)
+        self.assertEqual(state["vins_found"], 1)
+        self.assertEqual(state["missing_parts"], [3])
+
+        # Resending an accepted part is a no-op; different bytes are refused.
+        self.assertEqual(self._put_part(upload_id, 1, parts[0]).status_code, 200)
+        self.assertEqual(self._put_part(upload_id, 1, b"VIN\n").status_code, 409)
+        self.assertEqual(self.client.post(f"/uploads/{upload_id}/complete").status_code, 409)
+
+        self._put_part(upload_id, 3, parts[2])
+        completed = self.client.post(f"/uploads/{upload_id}/complete", json={"sha256": hashlib.sha256(body).hexdigest()})
+        self.assertEqual(completed.status_code, 201)
+        job_id = completed.get_json()["job_id"]
+        self.assertEqual(submit.call_args[0][:2], (job_id, ["1HGCM82633A004352", "2T3ZF4DV8BW073893"]))
+        self.assertEqual(self.client.post(f"/uploads/{upload_id}/complete").get_json()["job_id"], job_id)
+
+        with self.app.app_context():
+            row = get_job_record(job_id)
+        with open(os.path.join(self.upload_dir, row["stored_upload_name"]), "rb") as handle:
+            self.assertEqual(handle.read(), body)
+        self.assertFalse(os.path.exists(os.path.join(self.upload_dir, f"parts_{upload_id}")))
+
+    @mock.patch("vin_decoder.JobScheduler.submit")
+    def test_chunked_complete_answers_202_until_the_job_exists(self, submit):
+        body = b"VIN\n1HGCM82633A004352\n"
+        upload_id = self.client.post("/uploads", json={"filename": "fleet.csv"}).get_json()["upload_id"]
+        background = self.app.extensions["vin_decoder_background"]
+        background.is_leader = False
+        self._put_part(upload_id, 1, body[:10])
+        self._put_part(upload_id, 2, body[10:])
+        self._put_part(upload_id, 3, b"stray\n")
+
+        # Another worker only stores parts; completion waits for the leader to append them.
+        pending = self.client.post(f"/uploads/{upload_id}/complete", json={"total_parts": 2})
+        self.assertEqual(pending.status_code, 202)
+        self.assertIn("Retry-After", pending.headers)
+        self.assertIsNone(pending.get_json()["job_id"])
+        self.assertEqual([part["part_number"] for part in pending.get_json()["received_parts"]], [1, 2])
+        self.assertEqual(self._put_part(upload_id, 3, b"stray\n").status_code, 400)
+
+        background.is_leader = True
+        self.app.extensions["vin_decoder_chunked_uploads"].advance_ready()
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("UPDATE uploads SET lease_until = ?", (time.time() + 60,))
+        conn.commit()
+        self.assertEqual(conn.execute("SELECT content_sha256 FROM uploads").fetchone()[0], hashlib.sha256(body).hexdigest())
+        # A completion claimed by another request is not reported as a job yet.
+        busy = self.client.post(f"/uploads/{upload_id}/complete")
+        self.assertEqual(busy.status_code, 202)
+        self.assertIsNone(busy.get_json()["job_id"])
+        conn.execute("UPDATE uploads SET lease_until = NULL")
+        conn.commit()
+        conn.close()
+
+        done = self.client.post(f"/uploads/{upload_id}/complete", json={"sha256": hashlib.sha256(body).hexdigest()})
+        self.assertEqual(done.status_code, 201)
+        self.assertEqual(submit.call_args[0][:2], (done.get_json()["job_id"], ["1HGCM82633A004352"]))
+
+    def test_stale_chunked_upload_is_cleaned_up(self):
+        upload_id = self.client.post("/uploads", json={"filename": "fleet.csv"}).get_json()["upload_id"]
+        self._put_part(upload_id, 1, b"VIN\n1HGCM82633A004352\n")
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("UPDATE uploads SET updated_at = '2000-01-01 00:00:00'")
+        conn.commit()
+        conn.close()
+
+        run_cleanup(self.app)
+
+        self.assertEqual(self.client.get(f"/uploads/{upload_id}").status_code, 404)
+        self.assertEqual(os.listdir(self.upload_dir), [])
 
     def test_invalid_download_job_returns_404(self):
         response = self.client.get("/download/not-a-real-job")
@@ -78,6 +357,366 @@ class VinDecoderTests(unittest.TestCase):
         payload = response.get_json()
         self.assertTrue(payload["error"])
 
+    def test_init_db_applies_index_migrations(self):
+        conn = sqlite3.connect(self.db_path)
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        conn.close()
+
+        self.assertEqual(version, len(SCHEMA_MIGRATIONS))
+        self.assertIn("idx_jobs_created_at", indexes)
+        self.assertIn("idx_vin_cache_updated_at", indexes)
+
+    def test_cleanup_removes_stale_rows_in_batches(self):
+        self.app.config["CLEANUP_BATCH_SIZE"] = 2
+        stale = "2000-01-01 00:00:00"
+        conn = sqlite3.connect(self.db_path)
+        for index in range(5):
+            upload_name = f"source_{index}.csv"
+            open(os.path.join(self.upload_dir, upload_name), "w").close()
+            conn.execute(
+                """
+                INSERT INTO jobs (job_id, stored_upload_name, status, progress, completed, created_at, updated_at)
+                VALUES (?, ?, 'completed', 'Completed', 1, ?, ?)
+                """,
+                (f"job-{index}", upload_name, stale, stale),
+            )
+        conn.execute(
+            "INSERT INTO jobs (job_id, status, progress, created_at, updated_at) VALUES ('running', 'processing', '', ?, ?)",
+            (stale, stale),
+        )
+        conn.executemany(
+            "INSERT INTO vin_cache (vin, payload, updated_at) VALUES (?, '{}', ?)",
+            [(f"VIN{index}", stale) for index in range(5)],
+        )
+        conn.commit()
+        conn.close()
+
+        run_cleanup(self.app)
+
+        conn = sqlite3.connect(self.db_path)
+        job_ids = [row[0] for row in conn.execute("SELECT job_id FROM jobs")]
+        cache_count = conn.execute("SELECT COUNT(*) FROM vin_cache").fetchone()[0]
+        conn.close()
+        self.assertEqual(job_ids, ["running"])
+        self.assertEqual(cache_count, 0)
+        self.assertEqual(os.listdir(self.upload_dir), [])
+
+    def test_cleanup_keeps_results_read_by_a_reused_job(self):
+        stale = "2000-01-01 00:00:00"
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(
+            """
+            INSERT INTO jobs (job_id, status, progress, completed, created_at, updated_at)
+            VALUES ('source', 'completed', 'Completed', 1, ?, ?)
+            """,
+            (stale, stale),
+        )
+        conn.execute(
+            """
+            INSERT INTO jobs (job_id, status, progress, completed, reused_from_job_id, created_at, updated_at)
+            VALUES ('reuser', 'completed', 'Completed', 1, 'source', datetime('now'), datetime('now'))
+            """
+        )
+        conn.execute("INSERT INTO job_results (job_id, row_index, payload) VALUES ('source', 0, '{}')")
+        conn.commit()
+        conn.close()
+
+        run_cleanup(self.app)
+        conn = sqlite3.connect(self.db_path)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM job_results").fetchone()[0], 1)
+        conn.execute("UPDATE jobs SET updated_at = ? WHERE job_id = 'reuser'", (stale,))
+        conn.commit()
+        conn.close()
+
+        run_cleanup(self.app)
+        conn = sqlite3.connect(self.db_path)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM job_results").fetchone()[0], 0)
+        conn.close()
+
+    def _insert_cache_row(self, vin, updated_at):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(
+            "INSERT INTO vin_cache (vin, payload, updated_at) VALUES (?, ?, ?)",
+            (vin, json.dumps({"Make": "HONDA"}), updated_at),
+        )
+        conn.commit()
+        conn.close()
+
+    def test_stale_cache_entry_is_served_and_refreshed_once(self):
+        self._insert_cache_row("1HGCM82633A004352", "2000-01-01 00:00:00")
+        self.app.config["CACHE_TTL_HOURS"] = 1
+        self.app.config["CACHE_HARD_TTL_HOURS"] = 24 * 365 * 100
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_fetch(vin):
+            started.set()
+            release.wait(5)
+
+        with mock.patch("vin_decoder.fetch_vin_data", side_effect=slow_fetch) as fetch:
+            with self.app.app_context():
+                refresher = self.app.extensions["vin_decoder_cache_refresher"]
+                self.assertEqual(get_cached_vin_data("1HGCM82633A004352"), {"Make": "HONDA"})
+                self.assertEqual(get_cached_vin_data("1HGCM82633A004352"), {"Make": "HONDA"})
+                self.assertEqual(refresher.pending_count(), 1)
+            self.assertTrue(started.wait(5))
+            release.set()
+
+        fetch.assert_called_once_with("1HGCM82633A004352")
+
+    def test_cache_entry_past_hard_ttl_is_a_miss(self):
+        self._insert_cache_row("1HGCM82633A004352", "2000-01-01 00:00:00")
+        with self.app.app_context():
+            self.assertIsNone(get_cached_vin_data("1HGCM82633A004352"))
+            self.assertEqual(self.app.extensions["vin_decoder_cache_refresher"].pending_count(), 0)
+
+    def _run_jobs(self, policy, jobs):
+        finished = []
+        all_done = threading.Event()
+        scheduler = JobScheduler(self.app, workers=1, policy=policy, progress_interval=0)
+        decode = lambda vin, columns=None, decode_mode="online": {"VIN": vin}
+
+        def record_finish(job):
+            finished.append(job.job_id)
+            if len(finished) == len(jobs):
+                all_done.set()
+
+        with mock.patch("vin_decoder.decode_vin", side_effect=decode), mock.patch.object(
+            scheduler, "_finalize", side_effect=record_finish
+        ):
+            with self.app.app_context():
+                for job_id, vins in jobs:
+                    create_job_record(job_id, f"{job_id}.csv", None, len(vins))
+            with scheduler._cond:
+                for job_id, vins in jobs:
+                    scheduler.submit(job_id, vins)
+            self.assertTrue(all_done.wait(10))
+        return finished
+
+    def test_finished_job_records_its_lookup_errors(self):
+        with self.app.app_context():
+            create_job_record("outage", "fleet.csv", None, 2)
+        scheduler = JobScheduler(self.app, workers=1, policy="shortest_remaining")
+        job = _ScheduledJob(
+            "outage",
+            ["VIN0", "VIN1"],
+            1,
+            ["VIN", "Make"],
+            saved_results={0: {"VIN": "VIN0", "Make": "HONDA"}, 1: {"VIN": "VIN1", "Make": "Lookup Error"}},
+        )
+
+        with self.app.app_context():
+            scheduler._finalize(job)
+            self.assertEqual(get_job_record("outage")["lookup_errors"], 1)
+
+    def test_scheduler_shortest_remaining_finishes_small_job_first(self):
+        finished = self._run_jobs(
+            "shortest_remaining",
+            [("big", [f"BIG{index:014d}" for index in range(200)]), ("small", ["SMALL000000000001"] * 3)],
+        )
+        self.assertEqual(finished, ["small", "big"])
+
+    def test_only_the_lease_holder_decodes_and_it_resumes_handed_off_jobs(self):
+        other_worker = create_app(config_class=TestingConfig, overrides=dict(self.app.config))
+        self.assertTrue(self.app.extensions["vin_decoder_background"].is_leader)
+        self.assertFalse(other_worker.extensions["vin_decoder_background"].is_leader)
+
+        decoded = []
+        decode = lambda vin, columns=None, decode_mode="online": decoded.append(vin) or {"VIN": vin}
+        with mock.patch("vin_decoder.decode_vin", side_effect=decode):
+            with other_worker.app_context():
+                create_job_record("handoff", "fleet.csv", None, 3)
+                save_job_results([("handoff", 0, {"VIN": "VIN0"})])
+            other_worker.extensions["vin_decoder_scheduler"].submit("handoff", ["VIN0", "VIN1", "VIN2"])
+            self.assertEqual(decoded, [])
+
+            self.app.extensions["vin_decoder_background"].tick()
+            for _ in range(100):
+                with self.app.app_context():
+                    if get_job_record("handoff")["completed"]:
+                        break
+                time.sleep(0.05)
+
+        self.assertEqual(sorted(decoded), ["VIN1", "VIN2"])
+        with self.app.app_context():
+            self.assertTrue(get_job_record("handoff")["completed"])
+        with sqlite3.connect(self.db_path) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM job_inputs").fetchone()[0], 0)
+
+    def test_lease_renewal_does_not_wait_for_chunked_upload_assembly(self):
+        threaded = create_app(
+            config_class=TestingConfig,
+            overrides={
+                **self.app.config,
+                "DB_PATH": os.path.join(self.data_dir, "threaded.sqlite3"),
+                "BACKGROUND_POLL_SECONDS": 3600,
+            },
+        )
+        background = threaded.extensions["vin_decoder_background"]
+        self.addCleanup(background.stop)
+        assembling = threading.Event()
+        release = threading.Event()
+        self.addCleanup(release.set)
+        threaded.extensions["vin_decoder_chunked_uploads"].advance_ready = (
+            lambda: assembling.set() or release.wait(5)
+        )
+
+        background.tick()
+        self.assertTrue(assembling.wait(2))
+        started = time.monotonic()
+        background.tick()
+
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertTrue(background.is_leader)
+
+    def test_a_new_leader_waits_for_the_old_one_to_give_up_its_jobs(self):
+        old_leader = self.app
+        new_leader = create_app(config_class=TestingConfig, overrides=dict(self.app.config))
+        vins = [f"VIN{index}" for index in range(8)]
+        unblock = threading.Event()
+        decoded = []
+
+        def decode(vin, columns=None, decode_mode="online"):
+            app = vin_decoder.current_app._get_current_object()
+            if app is old_leader:
+                unblock.wait(5)
+            decoded.append((app is old_leader, vin))
+            return {"VIN": vin}
+
+        with mock.patch("vin_decoder.decode_vin", side_effect=decode):
+            with old_leader.app_context():
+                create_job_record("takeover", "fleet.csv", None, len(vins))
+            old_leader.extensions["vin_decoder_scheduler"].submit("takeover", vins)
+
+            # The lease lapses while the old leader is busy decoding.
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute("UPDATE leases SET expires_at = 0")
+            new_leader.extensions["vin_decoder_background"].tick()
+            self.assertTrue(new_leader.extensions["vin_decoder_background"].is_leader)
+            self.assertEqual(new_leader.extensions["vin_decoder_scheduler"].resume_pending(), 0)
+
+            old_leader.extensions["vin_decoder_background"].tick()
+            self.assertFalse(old_leader.extensions["vin_decoder_scheduler"].active)
+            unblock.set()
+            new_leader.extensions["vin_decoder_background"].tick()
+            for _ in range(100):
+                with new_leader.app_context():
+                    if get_job_record("takeover")["completed"]:
+                        break
+                time.sleep(0.05)
+
+        by_old_leader = [vin for old, vin in decoded if old]
+        by_new_leader = [vin for old, vin in decoded if not old]
+        # Only the decodes already in flight when the lease was lost are repeated.
+        self.assertLessEqual(len(by_old_leader), TestingConfig.JOB_WORKERS)
+        self.assertEqual(sorted(by_new_leader), vins)
+        with new_leader.app_context():
+            self.assertTrue(get_job_record("takeover")["completed"])
+
+    @mock.patch("vin_decoder.get_vin_data", side_effect=lambda vin, decode_mode="online": {"Make": "HONDA", "Model": "Accord", "Model Year": "2003"})
+    def test_uploaded_job_runs_to_completion(self, _get_vin_data):
+        response = self.client.post(
+            "/",
+            data={"file": (io.BytesIO(b"VIN\n1HGCM82633A004352\n2T3ZF4DV8BW073893\n"), "fleet.csv")},
+            content_type="multipart/form-data",
+        )
+        job_id = response.headers["Location"].rsplit("/", 1)[-1]
+
+        for _ in range(100):
+            payload = self.client.get(f"/status/{job_id}").get_json()
+            if payload["completed"]:
+                break
+            time.sleep(0.05)
+
+        self.assertEqual(payload["status"], "completed")
+        self.assertEqual(payload["current"], 2)
+        self.assertIsNone(payload["queue_position"])
+        download = self.client.get(payload["download_url"])
+        self.assertEqual(download.status_code, 200)
+        download.close()
+
+    def test_results_api_pages_through_partial_results(self):
+        with self.app.app_context():
+            create_job_record("running", "fleet.csv", None, 5)
+            save_job_results([("running", index, {"VIN": f"VIN{index}", "Make": "FORD"}) for index in (0, 1, 3)])
+
+        first = self.client.get("/jobs/running/results?offset=0&limit=2").get_json()
+        second = self.client.get(f"/jobs/running/results?offset={first['next_row_index']}&limit=2").get_json()
+
+        self.assertEqual(first["available"], 3)
+        self.assertEqual(first["total"], 5)
+        self.assertEqual([row["VIN"] for row in first["rows"]], ["VIN0", "VIN1"])
+        # Row 3 finished before row 2, so the page stops at the gap.
+        self.assertEqual(second["rows"], [])
+        self.assertEqual(second["next_row_index"], 2)
+
+        with self.app.app_context():
+            save_job_results([("running", 2, {"VIN": "VIN2"}), ("running", 4, {"VIN": "VIN4"})])
+        last = self.client.get("/jobs/running/results?row_index=2&limit=10").get_json()
+        self.assertEqual([row["VIN"] for row in last["rows"]], ["VIN2", "VIN3", "VIN4"])
+        self.assertIsNone(last["next_row_index"])
+        self.assertEqual(self.client.get("/jobs/running/results?limit=abc").status_code, 400)
+
+    def test_results_api_ends_on_a_short_page_of_a_finished_job(self):
+        with self.app.app_context():
+            create_job_record("reused", "fleet.csv", None, 3)
+            save_job_results([("reused", 0, {"VIN": "VIN0"})])
+            update_job_record("reused", status="completed", completed=True)
+
+        page = self.client.get("/jobs/reused/results?offset=0&limit=2").get_json()
+        alias = self.client.get("/jobs/reused/results?row_index=1").get_json()
+
+        self.assertEqual([row["VIN"] for row in page["rows"]], ["VIN0"])
+        self.assertIsNone(page["next_row_index"])
+        self.assertEqual(alias["offset"], 1)
+        self.assertEqual(self.client.get("/jobs/missing/results").status_code, 404)
+
+    def test_partial_results_stream_as_csv(self):
+        with self.app.app_context():
+            create_job_record("running", "fleet.csv", None, 5)
+            save_job_results([("running", 1, {"VIN": "VIN1", "Make": "FORD"}), ("running", 0, {"VIN": "VIN0", "Make": "HONDA"})])
+
+        response = self.client.get("/jobs/running/results.csv")
+        lines = response.get_data(as_text=True).splitlines()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("_partial.csv", response.headers["Content-Disposition"])
+        self.assertTrue(lines[0].startswith("Make,Model,"))
+        self.assertTrue(lines[0].endswith(",VIN"))
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[1].startswith("HONDA,") and lines[1].endswith(",VIN0"))
+
+    def test_scheduler_estimates_queue_position_and_eta(self):
+        scheduler = JobScheduler(self.app, workers=1, policy="shortest_remaining")
+        with scheduler._cond:
+            scheduler._seq = 2
+            scheduler._jobs = {
+                "big": mock.Mock(job_id="big", remaining=100, seq=1),
+                "small": mock.Mock(job_id="small", remaining=10, seq=2),
+            }
+            scheduler._completions.extend([0.0, 1.0, 2.0])
+            estimates = scheduler._estimates()
+        self.assertEqual(estimates["small"], (1, 10.0))
+        self.assertEqual(estimates["big"], (2, 110.0))
+
+    def test_shortest_remaining_does_not_starve_large_jobs(self):
+        scheduler = JobScheduler(self.app, workers=1, policy="shortest_remaining", starvation_limit=3)
+        big = _ScheduledJob("big", [f"VIN{index}" for index in range(100)], 1)
+        picks = []
+        with scheduler._cond:
+            scheduler._jobs["big"] = big
+            for seq in range(2, 14):
+                # A fresh one-VIN upload arrives before every pick.
+                scheduler._jobs[f"small{seq}"] = _ScheduledJob(f"small{seq}", ["VIN"], seq)
+                job = scheduler._pick()
+                job.pending.popleft()
+                if job is not big:
+                    scheduler._jobs.pop(job.job_id)
+                picks.append(job.job_id)
+        self.assertEqual(picks.count("big"), 3)
+        self.assertEqual(picks[:4], ["small2", "small3", "small4", "big"])
+
 
 if __name__ == "__main__":
     unittest.main()
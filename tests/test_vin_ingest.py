@@ -0,0 +1,120 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+from openpyxl import Workbook
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from vin_ingest import (
+    detect_vin_column,
+    read_csv_vins,
+    read_workbook_vins,
+    read_workbook_vins_isolated,
+    scan_csv_vin_values,
+)
+
+
+class VinIngestTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.workbook_path = os.path.join(self.temp_dir.name, "fleet.xlsx")
+
+        workbook = Workbook()
+        first = workbook.active
+        first.title = "Trucks"
+        first.append(["Fleet export"])
+        first.append(["Unit", "VIN", "Notes"])
+        first.append(["T-1", "1hgcm82633a004352", "lowercase"])
+        first.append(["T-2", None, "missing"])
+        first.append(["T-3", "1FTFW1ET5DFC10312", "ok"])
+
+        empty = workbook.create_sheet("Contacts")
+        empty.append(["Name", "Phone"])
+        empty.append(["Jo", "555-0100"])
+
+        second = workbook.create_sheet("Vans")
+        second.append(["VIN"])
+        second.append(["1FTFW1ET5DFC10312"])
+        second.append(["2T3ZF4DV8BW073893"])
+        workbook.save(self.workbook_path)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_detect_vin_column_returns_leftmost_match(self):
+        self.assertIsNone(detect_vin_column(["Unit", "VIN"]))
+        self.assertEqual(detect_vin_column(["T-1", " 1HGCM82633A004352 ", "2T3ZF4DV8BW073893"]), 1)
+
+    def test_scan_csv_vin_values_resumes_across_partial_lines(self):
+        data = b"\xef\xbb\xbfUnit,VIN\nT-1,1hgcm82633a004352\nT-2,\nT-3,1FTFW1"
+        values, column, consumed = scan_csv_vin_values(io.BytesIO(data), None)
+        self.assertEqual(values, ["1hgcm82633a004352"])
+        self.assertEqual(column, 1)
+        self.assertEqual(data[consumed:], b"T-3,1FTFW1")
+
+        rest = data[consumed:] + b"ET5DFC10312"
+        values, column, consumed = scan_csv_vin_values(io.BytesIO(rest), column)
+        self.assertEqual((values, consumed), ([], 0))
+        values, column, consumed = scan_csv_vin_values(io.BytesIO(rest), column, final=True)
+        self.assertEqual(values, ["1FTFW1ET5DFC10312"])
+        self.assertEqual(consumed, len(rest))
+
+    def test_scan_csv_vin_values_handles_quoted_newlines_and_cr_endings(self):
+        data = b'Note,VIN\r"two\nlines",1HGCM82633A004352\r"open\nquote",2T3ZF4DV8BW073893\rx,1FTFW1ET5DFC10312'
+        # Cut inside the quoted field: the record waits for the closing quote.
+        cut = data.index(b"open") + 6
+        values, column, consumed = scan_csv_vin_values(io.BytesIO(data[:cut]), None)
+        self.assertEqual(values, ["1HGCM82633A004352"])
+        self.assertEqual(data[consumed:cut], b'"open\nq')
+
+        stream = io.BytesIO(data)
+        stream.seek(consumed)
+        values, column, _ = scan_csv_vin_values(stream, column, final=True)
+        self.assertEqual(values, ["2T3ZF4DV8BW073893", "1FTFW1ET5DFC10312"])
+
+    def test_read_csv_vins_skips_preamble_and_repeats(self):
+        path = os.path.join(self.temp_dir.name, "fleet.csv")
+        with open(path, "wb") as handle:
+            handle.write(b"Fleet export\nUnit,VIN\nT-1,1hgcm82633a004352\nT-2,1HGCM82633A004352\nT-3,N/A\n")
+        self.assertEqual(read_csv_vins(path), ["1HGCM82633A004352", "N/A"])
+        with open(path, "wb") as handle:
+            handle.write(b"Unit,Plate\nT-1,ABC123\n")
+        self.assertIsNone(read_csv_vins(path))
+
+    def test_read_workbook_vins_walks_all_sheets(self):
+        self.assertEqual(
+            read_workbook_vins(self.workbook_path),
+            ["1HGCM82633A004352", "1FTFW1ET5DFC10312", "2T3ZF4DV8BW073893"],
+        )
+
+    def test_read_workbook_vins_can_limit_sheets(self):
+        self.assertEqual(
+            read_workbook_vins(self.workbook_path, sheet_names=["Vans"]),
+            ["1FTFW1ET5DFC10312", "2T3ZF4DV8BW073893"],
+        )
+
+    def test_isolated_read_matches_in_process_read(self):
+        self.assertEqual(
+            read_workbook_vins_isolated(self.workbook_path, timeout=60),
+            read_workbook_vins(self.workbook_path),
+        )
+
+
+    def test_isolated_read_failures_do_not_affect_later_parses(self):
+        broken_path = os.path.join(self.temp_dir.name, "broken.xlsx")
+        with open(broken_path, "wb") as handle:
+            handle.write(b"not a workbook")
+        with self.assertRaises(RuntimeError):
+            read_workbook_vins_isolated(broken_path, timeout=60)
+        with self.assertRaises(TimeoutError):
+            read_workbook_vins_isolated(self.workbook_path, timeout=0.001)
+        self.assertEqual(len(read_workbook_vins_isolated(self.workbook_path, timeout=60)), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import requests
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from config import TestingConfig
+from vin_decoder import build_vin_payload, create_app, get_vin_data
+from vpic_offline import compile_keys, decode_model_year, import_snapshot, load_offline_decoder, wmi_for_vin
+
+SNAPSHOT = {
+    "Element.csv": "Id,Name,LookupTable\n26,Make,Make\n28,Model,Model\n5,Body Class,BodyStyle\n9,Engine Number of Cylinders,\n",
+    "Make.csv": "Id,Name\n474,HONDA\n",
+    "Model.csv": "Id,Name\n1861,Accord\n1862,Civic\n",
+    "BodyStyle.csv": "Id,Name\n13,Sedan/Saloon\n3,Coupe\n",
+    "Manufacturer.csv": "Id,Name\n988,AMERICAN HONDA MOTOR CO. INC.\n",
+    "VehicleType.csv": "Id,Name\n2,PASSENGER CAR\n",
+    "Wmi.csv": "Id,Wmi,ManufacturerId,MakeId,VehicleTypeId\n1,1HG,988,474,2\n",
+    "Wmi_VinSchema.csv": "WmiId,VinSchemaId,YearFrom,YearTo\n1,100,1998,2007\n1,200,2010,2020\n",
+    "Pattern.csv": (
+        "VinSchemaId,Keys,ElementId,AttributeId\n"
+        "100,CM,28,1861\n"
+        "100,CM8[2-4],5,13\n"
+        "100,CM8[5-6],5,3\n"
+        "100,CM*2,9,4\n"
+        "100,CM*26,9,6\n"
+        "200,CM,28,1862\n"
+    ),
+}
+
+ACCORD_VIN = "1HGCM82633A004352"
+
+
+def write_snapshot(directory):
+    for name, content in SNAPSHOT.items():
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as handle:
+            handle.write(content)
+
+
+class VpicOfflineTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.source_dir = os.path.join(self.temp_dir.name, "csv")
+        os.makedirs(self.source_dir)
+        write_snapshot(self.source_dir)
+        self.db_path = os.path.join(self.temp_dir.name, "vpic.sqlite3")
+        self.counts = import_snapshot(self.source_dir, self.db_path)
+        self.decoder = load_offline_decoder(self.db_path)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_vin_helpers(self):
+        self.assertEqual(decode_model_year(ACCORD_VIN), 2003)
+        self.assertEqual(decode_model_year("5YJ3E1EA7KF317000"), 2019)
+        self.assertEqual(wmi_for_vin("1G9AB12345XYZ9876"), "1G9YZ9")
+        regex, specificity = compile_keys("CM*[2-4]")
+        self.assertEqual(specificity, 3)
+        self.assertTrue(regex.match("CM826|3A004352"))
+
+    def test_import_writes_indexed_tables(self):
+        self.assertEqual(self.counts, {"wmi_schemas": 2, "patterns": 6})
+        self.assertFalse(os.path.exists(self.db_path + ".importing"))
+
+    def test_decode_resolves_lookups_and_prefers_specific_patterns(self):
+        decoded = self.decoder.decode(ACCORD_VIN)
+        self.assertEqual(decoded["Make"], "HONDA")
+        self.assertEqual(decoded["Model"], "Accord")
+        self.assertEqual(decoded["Body Class"], "Sedan/Saloon")
+        self.assertEqual(decoded["Engine Number of Cylinders"], "6")
+        self.assertEqual(decoded["Manufacturer Name"], "AMERICAN HONDA MOTOR CO. INC.")
+        self.assertEqual(decoded["Vehicle Type"], "PASSENGER CAR")
+        self.assertEqual(decoded["Model Year"], "2003")
+
+    def test_decode_selects_schema_by_model_year(self):
+        self.assertEqual(self.decoder.decode("1HGCM8A23DA004352")["Model"], "Civic")
+
+    def test_year_outside_every_schema_only_decodes_the_wmi(self):
+        decoded = self.decoder.decode("1HGCM82638A004352")
+        self.assertEqual(decoded["Make"], "HONDA")
+        self.assertEqual(decoded["Model Year"], "2008")
+        # 2008 falls between the 1998-2007 and 2010-2020 schemas.
+        self.assertNotIn("Model", decoded)
+        self.assertEqual(build_vin_payload(decoded)["Model"], "Not Found")
+
+    def test_unknown_wmi_is_not_decoded(self):
+        self.assertIsNone(self.decoder.decode("WBA3A5C51CF256651"))
+        self.assertIsNone(load_offline_decoder(os.path.join(self.temp_dir.name, "missing.sqlite3")))
+
+    def _create_app(self, **overrides):
+        data_dir = os.path.join(self.temp_dir.name, "data")
+        os.makedirs(data_dir, exist_ok=True)
+        config = {
+            "TESTING": True,
+            "UPLOAD_DIR": os.path.join(self.temp_dir.name, "uploads"),
+            "DATA_DIR": data_dir,
+            "LOG_DIR": os.path.join(self.temp_dir.name, "logs"),
+            "DB_PATH": os.path.join(data_dir, "test.sqlite3"),
+            "VPIC_OFFLINE_DB": self.db_path,
+        }
+        config.update(overrides)
+        return create_app(config_class=TestingConfig, overrides=config)
+
+    def test_offline_jobs_never_call_upstream(self):
+        app = self._create_app()
+        with app.app_context(), mock.patch.object(app.extensions["vin_decoder_http_session"], "get") as get:
+            payload = get_vin_data(ACCORD_VIN, "offline")
+            missing = get_vin_data("WBA3A5C51CF256651", "offline")
+        get.assert_not_called()
+        self.assertEqual(payload["Make"], "HONDA")
+        self.assertEqual(payload["Body Class"], "Sedan/Saloon")
+        self.assertEqual(missing["Make"], "Not Found")
+
+    def test_offline_stale_cache_hits_are_not_refreshed(self):
+        app = self._create_app()
+        with app.app_context():
+            conn = sqlite3.connect(app.config["DB_PATH"])
+            conn.execute(
+                "INSERT INTO vin_cache (vin, payload, updated_at) VALUES (?, ?, ?)",
+                (ACCORD_VIN, json.dumps({"Make": "HONDA"}), "2000-01-01 00:00:00"),
+            )
+            conn.commit()
+            conn.close()
+            app.config["CACHE_HARD_TTL_HOURS"] = 24 * 365 * 100
+            with mock.patch.object(app.extensions["vin_decoder_cache_refresher"], "enqueue") as enqueue:
+                self.assertEqual(get_vin_data(ACCORD_VIN, "offline"), {"Make": "HONDA"})
+                enqueue.assert_not_called()
+                get_vin_data(ACCORD_VIN)
+                enqueue.assert_called_once_with(ACCORD_VIN)
+
+    def test_upstream_failure_falls_back_to_snapshot(self):
+        app = self._create_app()
+        error = requests.ConnectionError("down")
+        with app.app_context(), mock.patch.object(app.extensions["vin_decoder_http_session"], "get", side_effect=error):
+            self.assertEqual(get_vin_data(ACCORD_VIN)["Model"], "Accord")
+            app.config["VPIC_OFFLINE_FALLBACK"] = False
+            self.assertEqual(get_vin_data(ACCORD_VIN)["Model"], "Lookup Error")
+
+    def test_offline_upload_requires_a_snapshot(self):
+        app = self._create_app(VPIC_OFFLINE_DB=os.path.join(self.temp_dir.name, "missing.sqlite3"))
+        response = app.test_client().post(
+            "/",
+            data={"file": (open(os.path.join(PROJECT_ROOT, "static", "vin_upload_template.csv"), "rb"), "vins.csv"), "decode_mode": "offline"},
+            content_type="multipart/form-data",
+        )
+        self.assertIn(b"Offline decoding is not available", response.data)
+
+
+if __name__ == "__main__":
+    unittest.main()
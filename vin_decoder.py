@@ -1,9 +1,17 @@
+import collections
+import contextlib
+import csv
+import hashlib
+import io
 import json
 import logging
+import math
 import os
-import re
+import queue
+import socket
 import sqlite3
 import threading
+import time
 import uuid
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
@@ -13,6 +21,7 @@ import pandas as pd
 import requests
 from flask import (
     Flask,
+    Response,
     abort,
     current_app,
     jsonify,
@@ -25,21 +34,34 @@ from flask import (
 )
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+from openpyxl import Workbook
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.utils import secure_filename
 
+import rate_limit_storage  # noqa: F401  (registers the sqlite:// limiter storage)
+from chunked_upload import ASSEMBLY_LEASE_SECONDS, ChunkedUploadStore
 from config import get_config_class
+from fuel_economy import load_fuel_economy_index
+from vpic_offline import load_offline_decoder
+from vin_ingest import (
+    INCREMENTAL_EXTENSIONS,
+    STREAMING_EXCEL_EXTENSIONS,
+    VIN_REGEX,
+    read_csv_vins,
+    read_workbook_vins,
+    read_workbook_vins_isolated,
+    save_stream,
+)
 
 SCRIPT_DIR = Path(__file__).resolve().parent
 dotenv.load_dotenv(SCRIPT_DIR / ".env")
 
 LOGGER = logging.getLogger("vin_decoder")
 CLEANUP_LOCK = threading.Lock()
-LAST_CLEANUP_AT = 0.0
-
-VIN_REGEX = re.compile(r"^(?!.*[IOQ])[A-HJ-NPR-Z0-9]{17}$", re.IGNORECASE)
+FUEL_ECONOMY_LOCK = threading.Lock()
+OFFLINE_DECODER_LOCK = threading.Lock()
 
 FLEET_FIELD_MAP = {
     "Make": "Make",
@@ -168,6 +190,49 @@ FLEET_FIELD_MAP = {
     "Note": "Note",
 }
 
+MPG_COLUMNS = ("MPG City", "MPG Highway", "MPG Combined")
+LOOKUP_ERROR = "Lookup Error"
+
+FIELD_PROFILES = {
+    "essentials": (
+        "Make",
+        "Model",
+        "Model Year",
+        "Trim",
+        "Vehicle Type",
+        "Body Type",
+        "Fuel Type",
+        "Drive Type",
+        "Engine Number of Cylinders",
+        "Displacement (L)",
+    ),
+    "weights": (
+        "Make",
+        "Model",
+        "Model Year",
+        "Vehicle Class",
+        "GVWR From",
+        "GVWR To",
+        "GCWR From",
+        "GCWR To",
+        "Curb Weight (pounds)",
+        "Axles",
+        "Wheel Base (inches) From",
+    ),
+    "fuel_economy": (
+        "Make",
+        "Model",
+        "Model Year",
+        "Fuel Type",
+        "Electrification Level",
+        "Displacement (L)",
+        "Engine Number of Cylinders",
+        "Transmission Style",
+    )
+    + MPG_COLUMNS,
+    "full": tuple(FLEET_FIELD_MAP) + MPG_COLUMNS,
+}
+
 
 def utc_now() -> datetime:
     return datetime.now(timezone.utc)
@@ -229,6 +294,121 @@ def get_db_connection() -> sqlite3.Connection:
     return conn
 
 
+SCHEMA_MIGRATIONS = (
+    (
+        "CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs (created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_jobs_finished_updated_at ON jobs (updated_at) WHERE completed = 1 OR error = 1",
+        "CREATE INDEX IF NOT EXISTS idx_vin_cache_updated_at ON vin_cache (updated_at)",
+    ),
+    (
+        "ALTER TABLE jobs ADD COLUMN content_hash TEXT",
+        "ALTER TABLE jobs ADD COLUMN vin_set_hash TEXT",
+        "ALTER TABLE jobs ADD COLUMN reused_from_job_id TEXT",
+        "CREATE INDEX IF NOT EXISTS idx_jobs_content_hash ON jobs (content_hash, completed_at)",
+        "CREATE INDEX IF NOT EXISTS idx_jobs_vin_set_hash ON jobs (vin_set_hash, completed_at)",
+        "CREATE INDEX IF NOT EXISTS idx_jobs_output_file ON jobs (output_file)",
+    ),
+    (
+        "ALTER TABLE jobs ADD COLUMN queue_position INTEGER",
+        "ALTER TABLE jobs ADD COLUMN eta_seconds REAL",
+    ),
+    (
+        """
+        CREATE TABLE IF NOT EXISTS job_results (
+            job_id TEXT NOT NULL,
+            row_index INTEGER NOT NULL,
+            payload TEXT NOT NULL,
+            PRIMARY KEY (job_id, row_index)
+        ) WITHOUT ROWID
+        """,
+    ),
+    (
+        "ALTER TABLE jobs ADD COLUMN field_list TEXT",
+    ),
+    (
+        "CREATE INDEX IF NOT EXISTS idx_jobs_active ON jobs (updated_at, total, current) WHERE completed = 0",
+    ),
+    (
+        "ALTER TABLE jobs ADD COLUMN decode_mode TEXT NOT NULL DEFAULT 'online'",
+    ),
+    (
+        """
+        CREATE TABLE IF NOT EXISTS uploads (
+            upload_id TEXT PRIMARY KEY,
+            filename TEXT NOT NULL,
+            stored_upload_name TEXT NOT NULL,
+            field_list TEXT,
+            decode_mode TEXT NOT NULL DEFAULT 'online',
+            total_parts INTEGER,
+            assembled_parts INTEGER NOT NULL DEFAULT 0,
+            assembled_bytes INTEGER NOT NULL DEFAULT 0,
+            scan_offset INTEGER NOT NULL DEFAULT 0,
+            scan_column INTEGER,
+            vins_found INTEGER NOT NULL DEFAULT 0,
+            vins_bytes INTEGER NOT NULL DEFAULT 0,
+            lease_until REAL,
+            job_id TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS upload_parts (
+            upload_id TEXT NOT NULL,
+            part_number INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            sha256 TEXT NOT NULL,
+            PRIMARY KEY (upload_id, part_number)
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_uploads_updated_at ON uploads (updated_at)",
+    ),
+    (
+        """
+        CREATE TABLE IF NOT EXISTS job_inputs (
+            job_id TEXT PRIMARY KEY,
+            vins TEXT NOT NULL
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            throughput REAL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS parse_slots (
+            token TEXT PRIMARY KEY,
+            bytes INTEGER NOT NULL,
+            expires_at REAL NOT NULL
+        )
+        """,
+    ),
+    ("CREATE INDEX IF NOT EXISTS idx_jobs_reused_from ON jobs (reused_from_job_id)",),
+    ("ALTER TABLE uploads ADD COLUMN content_sha256 TEXT",),
+    (
+        "ALTER TABLE job_inputs ADD COLUMN holder TEXT",
+        "ALTER TABLE job_inputs ADD COLUMN held_until REAL",
+    ),
+    ("ALTER TABLE jobs ADD COLUMN lookup_errors INTEGER NOT NULL DEFAULT 0",),
+)
+
+
+def apply_schema_migrations(conn: sqlite3.Connection) -> None:
+    """Bring the schema up to date, tracking progress in ``PRAGMA user_version``."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for target, statements in enumerate(SCHEMA_MIGRATIONS, start=1):
+        if target <= version:
+            continue
+        with conn:
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {target}")
+        log_event("db.migrated", version=target)
+
+
 def init_db(app: Flask) -> None:
     with app.app_context():
         conn = sqlite3.connect(app.config["DB_PATH"], timeout=10)
@@ -263,6 +443,7 @@ def init_db(app: Flask) -> None:
             """
         )
         conn.commit()
+        apply_schema_migrations(conn)
         conn.close()
 
 
@@ -277,7 +458,15 @@ def default_status_payload():
         "file": "",
         "error": False,
         "download_url": None,
+        "results_url": None,
+        "partial_download_url": None,
         "source_filename": None,
+        "reused_from": None,
+        "fields": None,
+        "decode_mode": None,
+        "queue_position": None,
+        "eta_seconds": None,
+        "estimated_completion_at": None,
         "created_at": None,
         "updated_at": None,
     }
@@ -288,6 +477,13 @@ def serialize_job(row):
         return default_status_payload()
 
     output_file = row["output_file"] or ""
+    eta_seconds = row["eta_seconds"]
+    estimated_completion_at = None
+    if eta_seconds is not None and row["updated_at"]:
+        estimated_completion_at = (
+            parse_datetime(row["updated_at"]) + timedelta(seconds=eta_seconds)
+        ).strftime("%Y-%m-%d %H:%M:%S")
+
     return {
         "job_id": row["job_id"],
         "status": row["status"],
@@ -298,21 +494,39 @@ def serialize_job(row):
         "file": output_file,
         "error": bool(row["error"]),
         "download_url": url_for("download_job", job_id=row["job_id"]) if output_file else None,
+        "results_url": url_for("job_results", job_id=row["job_id"]),
+        "partial_download_url": url_for("download_partial_results", job_id=row["job_id"]),
         "source_filename": row["source_filename"],
+        "reused_from": row["reused_from_job_id"],
+        "fields": job_field_list(row),
+        "decode_mode": row["decode_mode"],
+        "queue_position": row["queue_position"],
+        "eta_seconds": eta_seconds,
+        "estimated_completion_at": estimated_completion_at,
         "created_at": row["created_at"],
         "updated_at": row["updated_at"],
     }
 
 
-def create_job_record(job_id: str, source_filename: str, stored_upload_name: str, total: int) -> None:
+def create_job_record(
+    job_id: str,
+    source_filename: str,
+    stored_upload_name: str,
+    total: int,
+    content_hash: str = None,
+    vin_set_hash: str = None,
+    field_list=None,
+    decode_mode: str = "online",
+) -> None:
     now = utc_now_iso()
     conn = get_db_connection()
     conn.execute(
         """
         INSERT INTO jobs (
             job_id, source_filename, stored_upload_name, status, progress,
-            current, total, completed, error, output_file, created_at, updated_at, completed_at
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            current, total, completed, error, output_file, created_at, updated_at, completed_at,
+            content_hash, vin_set_hash, field_list, decode_mode
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """,
         (
             job_id,
@@ -328,12 +542,43 @@ def create_job_record(job_id: str, source_filename: str, stored_upload_name: str
             now,
             now,
             None,
+            content_hash,
+            vin_set_hash,
+            json.dumps(field_list) if field_list else None,
+            decode_mode,
         ),
     )
     conn.commit()
     conn.close()
 
 
+def create_reused_job_record(job_id: str, source_filename: str, source_row, content_hash: str, vin_set_hash: str) -> None:
+    """Record a job that completes immediately by pointing at ``source_row``'s output."""
+    create_job_record(
+        job_id,
+        source_filename,
+        None,
+        source_row["total"],
+        content_hash,
+        vin_set_hash,
+        job_field_list(source_row),
+        source_row["decode_mode"],
+    )
+    now = utc_now_iso()
+    update_job_record(
+        job_id,
+        status="completed",
+        progress="Completed (reused results from an identical upload)",
+        current=source_row["total"],
+        completed=True,
+        error=False,
+        output_file=source_row["output_file"],
+        completed_at=now,
+        # Always the job that owns the rows, so reuse never chains.
+        reused_from_job_id=results_job_id(source_row),
+    )
+
+
 def update_job_record(job_id: str, **fields) -> None:
     if not fields:
         return
@@ -356,6 +601,50 @@ def get_job_record(job_id: str):
     return row
 
 
+def job_field_list(row):
+    return json.loads(row["field_list"]) if row["field_list"] else output_columns()
+
+
+def find_reusable_job(hash_column: str, hash_value: str, field_list, decode_mode: str = "online"):
+    """Return the newest completed job with the same hash, fields and mode whose output still exists.
+
+    Jobs with "Lookup Error" rows, typically finished during an upstream
+    outage, are never reused; the next identical upload decodes again.
+    """
+    if hash_column not in ("content_hash", "vin_set_hash"):
+        raise ValueError(f"unsupported hash column: {hash_column}")
+
+    window_hours = current_app.config["UPLOAD_DEDUPE_WINDOW_HOURS"]
+    if not hash_value or window_hours <= 0:
+        return None
+
+    cutoff_iso = (utc_now() - timedelta(hours=window_hours)).strftime("%Y-%m-%d %H:%M:%S")
+    conn = get_db_connection()
+    rows = conn.execute(
+        f"""
+        SELECT * FROM jobs
+        WHERE {hash_column} = ?
+          AND field_list IS ?
+          AND decode_mode = ?
+          AND completed_at >= ?
+          AND status = 'completed'
+          AND error = 0
+          AND lookup_errors = 0
+          AND output_file IS NOT NULL
+        ORDER BY completed_at DESC
+        LIMIT 5
+        """,
+        (hash_value, json.dumps(field_list), decode_mode, cutoff_iso),
+    ).fetchall()
+    conn.close()
+
+    upload_dir = Path(current_app.config["UPLOAD_DIR"])
+    for row in rows:
+        if (upload_dir / row["output_file"]).is_file():
+            return row
+    return None
+
+
 def get_latest_job_record():
     conn = get_db_connection()
     row = conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT 1").fetchone()
@@ -380,24 +669,33 @@ def list_recent_jobs(limit: int):
     return items
 
 
-def get_cached_vin_data(vin: str):
-    cutoff = utc_now() - timedelta(hours=current_app.config["CACHE_TTL_HOURS"])
+def cache_hard_ttl_hours() -> int:
+    return max(current_app.config["CACHE_HARD_TTL_HOURS"], current_app.config["CACHE_TTL_HOURS"])
+
+
+def get_cached_vin_data(vin: str, refresh: bool = True):
+    """Return the cached payload for ``vin`` using stale-while-revalidate.
+
+    Entries younger than ``CACHE_TTL_HOURS`` are fresh. Entries between that
+    soft TTL and ``CACHE_HARD_TTL_HOURS`` are still returned, and a background
+    refresh is queued unless ``refresh`` is false. Past the hard TTL the
+    caller has to refetch.
+    """
     conn = get_db_connection()
     row = conn.execute("SELECT payload, updated_at FROM vin_cache WHERE vin = ?", (vin,)).fetchone()
+    conn.close()
 
     if not row:
-        conn.close()
         return None
 
+    now = utc_now()
     updated_at = parse_datetime(row["updated_at"])
-    if updated_at and updated_at < cutoff:
-        conn.execute("DELETE FROM vin_cache WHERE vin = ?", (vin,))
-        conn.commit()
-        conn.close()
+    if updated_at and updated_at < now - timedelta(hours=cache_hard_ttl_hours()):
         return None
 
     payload = json.loads(row["payload"])
-    conn.close()
+    if refresh and updated_at and updated_at < now - timedelta(hours=current_app.config["CACHE_TTL_HOURS"]):
+        current_app.extensions["vin_decoder_cache_refresher"].enqueue(vin)
     return payload
 
 
@@ -417,15 +715,73 @@ def cache_vin_data(vin: str, payload) -> None:
     conn.close()
 
 
+def save_upload(uploaded_file, upload_path: Path) -> str:
+    """Stream an uploaded file to disk and return its SHA-256 hex digest."""
+    return save_stream(uploaded_file.stream, upload_path)[1]
+
+
+def hash_vin_set(vins) -> str:
+    """Hash the normalized set of VINs so reordered or re-saved copies of a list match."""
+    digest = hashlib.sha256()
+    for vin in sorted({str(vin).strip().upper() for vin in vins}):
+        digest.update(vin.encode("ascii", "ignore"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
 def allowed_file(filename: str) -> bool:
     return "." in filename and filename.rsplit(".", 1)[1].lower() in current_app.config["ALLOWED_EXTENSIONS"]
 
 
-def get_vin_data(vin: str):
-    cached = get_cached_vin_data(vin)
-    if cached:
-        return cached
+DECODE_MODES = ("online", "offline")
+
+
+def build_vin_payload(decoded_lookup):
+    """Map vPIC ``{variable: value}`` pairs onto the ``FLEET_FIELD_MAP`` columns."""
+
+    def pick(variable_name):
+        value = decoded_lookup.get(variable_name)
+        if value is None:
+            return "Not Found"
+        if isinstance(value, str) and not value.strip():
+            return "Not Found"
+        return value
+
+    return {out_key: pick(var_name) for out_key, var_name in FLEET_FIELD_MAP.items()}
+
+
+def get_offline_decoder():
+    """Open the imported vPIC snapshot once per app; ``None`` if none has been imported."""
+    extensions = current_app.extensions
+    if "vin_decoder_offline_decoder" not in extensions:
+        with OFFLINE_DECODER_LOCK:
+            if "vin_decoder_offline_decoder" not in extensions:
+                extensions["vin_decoder_offline_decoder"] = load_offline_decoder(current_app.config["VPIC_OFFLINE_DB"])
+    return extensions["vin_decoder_offline_decoder"]
+
 
+def decode_vin_offline(vin: str):
+    """Decode ``vin`` from the local vPIC snapshot, or return ``None`` if it can't."""
+    decoder = get_offline_decoder()
+    if decoder is None:
+        return None
+    try:
+        decoded_lookup = decoder.decode(vin)
+    except sqlite3.Error as exc:
+        LOGGER.exception("offline decode failed", exc_info=exc)
+        return None
+    if decoded_lookup is None:
+        return None
+    return build_vin_payload(decoded_lookup)
+
+
+def fetch_vin_data(vin: str, fallback_offline: bool = False):
+    """Decode ``vin`` against the upstream API and cache the result.
+
+    With ``fallback_offline`` an upstream failure is answered from the local
+    vPIC snapshot instead of a "Lookup Error" row. Offline results are not
+    cached, so the next job still tries upstream first.
+    """
     try:
         response = current_app.extensions["vin_decoder_http_session"].get(
             f"{current_app.config['NHTSA_API_BASE']}{vin}?format=json",
@@ -439,19 +795,81 @@ def get_vin_data(vin: str):
             if variable:
                 decoded_lookup[variable] = item.get("Value")
 
-        def pick(variable_name):
-            value = decoded_lookup.get(variable_name)
-            if value is None:
-                return "Not Found"
-            if isinstance(value, str) and not value.strip():
-                return "Not Found"
-            return value
-
-        payload = {out_key: pick(var_name) for out_key, var_name in FLEET_FIELD_MAP.items()}
+        payload = build_vin_payload(decoded_lookup)
         cache_vin_data(vin, payload)
         return payload
     except (requests.RequestException, ValueError):
-        return {key: "Lookup Error" for key in FLEET_FIELD_MAP.keys()}
+        if fallback_offline:
+            payload = decode_vin_offline(vin)
+            if payload is not None:
+                log_event("decode.offline_fallback", vin=vin)
+                return payload
+        return {key: LOOKUP_ERROR for key in FLEET_FIELD_MAP.keys()}
+
+
+def get_vin_data(vin: str, decode_mode: str = "online"):
+    # Offline jobs must not reach vPIC, not even through a background refresh.
+    cached = get_cached_vin_data(vin, refresh=decode_mode != "offline")
+    if cached:
+        return cached
+
+    if decode_mode == "offline":
+        payload = decode_vin_offline(vin)
+        if payload is None:
+            payload = {key: "Not Found" for key in FLEET_FIELD_MAP.keys()}
+            payload["Error Text"] = "VIN not found in the offline vPIC snapshot"
+        return payload
+
+    return fetch_vin_data(vin, fallback_offline=current_app.config["VPIC_OFFLINE_FALLBACK"])
+
+
+class CacheRefresher:
+    """Background refresher for stale ``vin_cache`` entries.
+
+    Requests are deduplicated while pending, capped at ``max_pending`` and
+    drained by a single worker thread at no more than ``per_minute`` upstream
+    calls. A refresh that fails leaves the stale entry in place; the next
+    read past the soft TTL simply queues it again.
+    """
+
+    def __init__(self, app: Flask, per_minute: int, max_pending: int):
+        self.app = app
+        self.min_interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._queue = queue.Queue()
+        self._worker = None
+
+    def enqueue(self, vin: str) -> bool:
+        with self._lock:
+            if vin in self._pending or len(self._pending) >= self.max_pending:
+                return False
+            self._pending.add(vin)
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="vin-decoder-cache-refresh", daemon=True)
+                self._worker.start()
+        self._queue.put(vin)
+        return True
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def _run(self) -> None:
+        while True:
+            vin = self._queue.get()
+            try:
+                with self.app.app_context():
+                    fetch_vin_data(vin)
+                log_event("cache.refreshed", vin=vin)
+            except Exception as exc:
+                LOGGER.exception("cache refresh failed", exc_info=exc)
+            finally:
+                with self._lock:
+                    self._pending.discard(vin)
+            if self.min_interval:
+                time.sleep(self.min_interval)
 
 
 def find_vin_column(df: pd.DataFrame):
@@ -461,110 +879,1096 @@ def find_vin_column(df: pd.DataFrame):
     return None
 
 
-def get_mpg(make, model, year):
-    return {"MPG City": "No Data", "MPG Highway": "No Data", "MPG Combined": "No Data"}
+def read_upload_vins(upload_path: Path):
+    """Return the unique VINs in an upload, or ``None`` if no VIN column exists."""
+    suffix = upload_path.suffix.lower()
+    if suffix in STREAMING_EXCEL_EXTENSIONS:
+        if current_app.config["EXCEL_PARSE_IN_SUBPROCESS"]:
+            vins = read_workbook_vins_isolated(
+                upload_path,
+                timeout=current_app.config["EXCEL_PARSE_TIMEOUT_SECONDS"],
+            )
+        else:
+            vins = read_workbook_vins(upload_path)
+        return vins or None
 
+    if suffix in INCREMENTAL_EXTENSIONS:
+        # Same reader as chunked uploads, so both routes find the same VIN set.
+        return read_csv_vins(upload_path)
 
-def run_cleanup_if_due(force: bool = False) -> None:
-    global LAST_CLEANUP_AT
+    df = pd.read_excel(upload_path)
+    vin_column = find_vin_column(df)
+    if not vin_column:
+        return None
+    return list(df[vin_column].dropna().astype(str).str.upper().unique())
+
+
+def output_columns(fields=None):
+    """Column order of job output: the selected fields (all by default), then ``VIN``."""
+    columns = list(fields) if fields else list(FLEET_FIELD_MAP) + list(MPG_COLUMNS)
+    if "VIN" not in columns:
+        columns.append("VIN")
+    return columns
+
+
+def parse_field_list(values):
+    """Flatten repeated and comma-separated ``fields`` form values."""
+    fields = []
+    for value in values or ():
+        fields.extend(part.strip() for part in value.split(",") if part.strip())
+    return fields
+
+
+def resolve_field_selection(profile=None, fields=None):
+    """Turn a named profile or an explicit column list into output fields.
+
+    Explicit ``fields`` win over ``profile`` and keep the caller's order.
+    Names are matched case-insensitively; unknown names raise ``ValueError``.
+    """
+    if fields:
+        known = {name.lower(): name for name in list(FLEET_FIELD_MAP) + list(MPG_COLUMNS) + ["VIN"]}
+        selected = []
+        unknown = []
+        for name in fields:
+            match = known.get(name.strip().lower())
+            if match is None:
+                unknown.append(name.strip())
+            elif match not in selected:
+                selected.append(match)
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+        return selected
+
+    profile = (profile or current_app.config["DEFAULT_FIELD_PROFILE"]).strip().lower()
+    if profile not in FIELD_PROFILES:
+        raise ValueError(f"Unknown field profile: {profile}")
+    return list(FIELD_PROFILES[profile])
+
+
+def get_fuel_economy_index():
+    """Load the local fuel-economy snapshot once per app; ``None`` if none is configured."""
+    extensions = current_app.extensions
+    if "vin_decoder_fuel_economy" not in extensions:
+        with FUEL_ECONOMY_LOCK:
+            if "vin_decoder_fuel_economy" not in extensions:
+                index = None
+                try:
+                    index = load_fuel_economy_index(current_app.config["FUEL_ECONOMY_CSV"])
+                except (OSError, csv.Error, UnicodeDecodeError) as exc:
+                    LOGGER.exception("fuel economy snapshot could not be loaded", exc_info=exc)
+                if index is not None:
+                    log_event("fuel_economy.loaded", entries=len(index))
+                extensions["vin_decoder_fuel_economy"] = index
+    return extensions["vin_decoder_fuel_economy"]
 
-    with CLEANUP_LOCK:
-        now = datetime.now().timestamp()
-        if not force and now - LAST_CLEANUP_AT < 300:
-            return
-        LAST_CLEANUP_AT = now
 
-    with current_app.app_context():
-        job_cutoff = utc_now() - timedelta(hours=current_app.config["CLEANUP_TTL_HOURS"])
-        cache_cutoff = utc_now() - timedelta(hours=current_app.config["CACHE_TTL_HOURS"])
-        cutoff_iso = job_cutoff.strftime("%Y-%m-%d %H:%M:%S")
-        cache_cutoff_iso = cache_cutoff.strftime("%Y-%m-%d %H:%M:%S")
+def get_mpg(make, model, year):
+    index = get_fuel_economy_index()
+    if index is None:
+        return {"MPG City": "No Data", "MPG Highway": "No Data", "MPG Combined": "No Data"}
+    return index.get_mpg(make, model, year)
 
-        conn = get_db_connection()
-        stale_jobs = conn.execute(
-            """
-            SELECT job_id, stored_upload_name, output_file
-            FROM jobs
-            WHERE updated_at < ?
-              AND (completed = 1 OR error = 1)
-            """,
-            (cutoff_iso,),
-        ).fetchall()
-
-        for row in stale_jobs:
-            for file_name in (row["stored_upload_name"], row["output_file"]):
-                if file_name:
-                    path = Path(current_app.config["UPLOAD_DIR"]) / file_name
-                    path.unlink(missing_ok=True)
-
-        if stale_jobs:
-            conn.executemany("DELETE FROM jobs WHERE job_id = ?", [(row["job_id"],) for row in stale_jobs])
-
-        conn.execute("DELETE FROM vin_cache WHERE updated_at < ?", (cache_cutoff_iso,))
+
+def _delete_stale_jobs_batch(conn: sqlite3.Connection, upload_dir: Path, cutoff_iso: str, batch_size: int) -> int:
+    stale_jobs = conn.execute(
+        """
+        SELECT job_id, stored_upload_name, output_file, reused_from_job_id
+        FROM jobs
+        WHERE (completed = 1 OR error = 1)
+          AND updated_at < ?
+        ORDER BY updated_at
+        LIMIT ?
+        """,
+        (cutoff_iso, batch_size),
+    ).fetchall()
+
+    batch_ids = {row["job_id"] for row in stale_jobs}
+    for row in stale_jobs:
+        if row["stored_upload_name"]:
+            (upload_dir / row["stored_upload_name"]).unlink(missing_ok=True)
+
+        output_file = row["output_file"]
+        if not output_file:
+            continue
+        # Deduplicated uploads share the output of the job they reused.
+        sharing_jobs = conn.execute("SELECT job_id FROM jobs WHERE output_file = ?", (output_file,)).fetchall()
+        if all(sharing["job_id"] in batch_ids for sharing in sharing_jobs):
+            (upload_dir / output_file).unlink(missing_ok=True)
+
+    if stale_jobs:
+        job_ids = [(row["job_id"],) for row in stale_jobs]
+        conn.executemany("DELETE FROM job_inputs WHERE job_id = ?", job_ids)
+        conn.executemany("DELETE FROM jobs WHERE job_id = ?", job_ids)
+        # Reused jobs read the rows of their source job, so rows are only
+        # dropped once neither the source nor any job reusing it remains.
+        result_owners = batch_ids | {row["reused_from_job_id"] for row in stale_jobs if row["reused_from_job_id"]}
+        for owner in result_owners:
+            still_read = conn.execute(
+                "SELECT 1 FROM jobs WHERE job_id = ? OR reused_from_job_id = ? LIMIT 1", (owner, owner)
+            ).fetchone()
+            if still_read is None:
+                conn.execute("DELETE FROM job_results WHERE job_id = ?", (owner,))
         conn.commit()
-        conn.close()
+    return len(stale_jobs)
 
-        if stale_jobs:
-            log_event("cleanup.completed", removed_jobs=len(stale_jobs))
 
+def _delete_stale_cache_batch(conn: sqlite3.Connection, cutoff_iso: str, batch_size: int) -> int:
+    cursor = conn.execute(
+        """
+        DELETE FROM vin_cache
+        WHERE rowid IN (
+            SELECT rowid FROM vin_cache WHERE updated_at < ? LIMIT ?
+        )
+        """,
+        (cutoff_iso, batch_size),
+    )
+    conn.commit()
+    return cursor.rowcount
 
-def process_vins_in_background(app: Flask, job_id: str, vin_series, batch_size: int = 100) -> None:
-    with app.app_context():
-        try:
-            update_job_record(
-                job_id,
-                status="processing",
-                progress="Starting decode...",
-                current=0,
-                total=len(vin_series),
-                completed=False,
-                error=False,
-            )
 
-            vin_details_list = []
-            total = len(vin_series)
+def run_cleanup(app: Flask) -> None:
+    """Delete expired jobs and cache rows in small indexed batches.
+
+    Each batch is its own short transaction so request handlers never wait
+    long on the SQLite write lock. Work stops once the time budget is spent;
+    whatever is left is picked up on the next scheduler tick.
+    """
+    if not CLEANUP_LOCK.acquire(blocking=False):
+        return
 
-            for index, vin in enumerate(vin_series, start=1):
-                update_job_record(
-                    job_id,
-                    progress=f"Processing VIN {index}/{total}",
-                    current=index - 1,
-                    total=total,
+    try:
+        with app.app_context():
+            batch_size = max(1, current_app.config["CLEANUP_BATCH_SIZE"])
+            deadline = time.monotonic() + current_app.config["CLEANUP_TIME_BUDGET_SECONDS"]
+            upload_dir = Path(current_app.config["UPLOAD_DIR"])
+            job_cutoff = utc_now() - timedelta(hours=current_app.config["CLEANUP_TTL_HOURS"])
+            cache_cutoff = utc_now() - timedelta(hours=cache_hard_ttl_hours())
+            cutoff_iso = job_cutoff.strftime("%Y-%m-%d %H:%M:%S")
+            cache_cutoff_iso = cache_cutoff.strftime("%Y-%m-%d %H:%M:%S")
+            upload_cutoff = utc_now() - timedelta(hours=current_app.config["CHUNKED_UPLOAD_TTL_HOURS"])
+            upload_cutoff_iso = upload_cutoff.strftime("%Y-%m-%d %H:%M:%S")
+            chunked_uploads = current_app.extensions["vin_decoder_chunked_uploads"]
+
+            removed_jobs = 0
+            removed_cache = 0
+            removed_uploads = 0
+            conn = get_db_connection()
+            try:
+                while time.monotonic() < deadline:
+                    removed = _delete_stale_jobs_batch(conn, upload_dir, cutoff_iso, batch_size)
+                    removed_jobs += removed
+                    if removed < batch_size:
+                        break
+
+                while time.monotonic() < deadline:
+                    removed = _delete_stale_cache_batch(conn, cache_cutoff_iso, batch_size)
+                    removed_cache += removed
+                    if removed < batch_size:
+                        break
+
+                while time.monotonic() < deadline:
+                    removed = chunked_uploads.delete_stale_batch(conn, upload_cutoff_iso, batch_size)
+                    removed_uploads += removed
+                    if removed < batch_size:
+                        break
+            finally:
+                conn.close()
+
+            if removed_jobs or removed_cache or removed_uploads:
+                log_event(
+                    "cleanup.completed",
+                    removed_jobs=removed_jobs,
+                    removed_cache=removed_cache,
+                    removed_uploads=removed_uploads,
                 )
-                vin_data = get_vin_data(vin)
-                mpg_data = get_mpg(vin_data["Make"], vin_data["Model"], vin_data["Model Year"])
-                vin_data.update(mpg_data)
-                vin_data["VIN"] = vin
-                vin_details_list.append(vin_data)
+    finally:
+        CLEANUP_LOCK.release()
+
+
+def decode_vin(vin: str, columns=None, decode_mode: str = "online"):
+    """Build one output row with only ``columns``; the full payload stays cached."""
+    columns = columns or output_columns()
+    vin_data = get_vin_data(vin, decode_mode)
+    mpg_data = {}
+    if any(column in MPG_COLUMNS for column in columns):
+        mpg_data = get_mpg(vin_data["Make"], vin_data["Model"], vin_data["Model Year"])
+
+    row = {}
+    for column in columns:
+        if column == "VIN":
+            row[column] = vin
+        elif column in MPG_COLUMNS:
+            row[column] = mpg_data.get(column, "No Data")
+        else:
+            row[column] = vin_data.get(column, "Not Found")
+    return row
+
+
+def write_job_output(job_id: str, vin_details_list, columns=None) -> str:
+    """Write rows to XLSX with openpyxl's write-only mode, one row at a time."""
+    columns = columns or output_columns()
+    output_file = f"decoded_{job_id}.xlsx"
+    result_path = Path(current_app.config["UPLOAD_DIR"]) / output_file
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet("Sheet1")
+    worksheet.append(columns)
+    for row in vin_details_list:
+        values = []
+        for column in columns:
+            value = row.get(column)
+            values.append("Not Found" if value is None else value)
+        worksheet.append(values)
+    workbook.save(result_path)
+    return output_file
+
+
+def mark_job_failed(job_id: str, exc: Exception) -> None:
+    LOGGER.exception("job failed", exc_info=exc)
+    update_job_record(
+        job_id,
+        status="failed",
+        progress="Processing failed. Please try again.",
+        completed=True,
+        error=True,
+        queue_position=None,
+        eta_seconds=None,
+        completed_at=utc_now_iso(),
+    )
+    log_event("job.failed", job_id=job_id, error=str(exc))
+
+
+def update_job_progress_batch(progress_rows) -> None:
+    """Write ``(job_id, progress, current, queue_position, eta_seconds)`` rows in one transaction."""
+    if not progress_rows:
+        return
+
+    now = utc_now_iso()
+    conn = get_db_connection()
+    conn.executemany(
+        """
+        UPDATE jobs
+        SET progress = ?, current = ?, queue_position = ?, eta_seconds = ?, updated_at = ?
+        WHERE job_id = ? AND completed = 0
+        """,
+        [(progress, current, position, eta, now, job_id) for job_id, progress, current, position, eta in progress_rows],
+    )
+    conn.commit()
+    conn.close()
+
+
+def save_job_results(result_rows) -> None:
+    """Persist ``(job_id, row_index, row)`` tuples so any web worker can page through them."""
+    if not result_rows:
+        return
+
+    conn = get_db_connection()
+    conn.executemany(
+        "INSERT OR REPLACE INTO job_results (job_id, row_index, payload) VALUES (?, ?, ?)",
+        [(job_id, index, json.dumps(row, separators=(",", ":"), default=str)) for job_id, index, row in result_rows],
+    )
+    conn.commit()
+    conn.close()
+
 
-            results_df = pd.DataFrame(vin_details_list).fillna("Not Found")
-            output_file = f"decoded_{job_id}.xlsx"
-            result_path = Path(current_app.config["UPLOAD_DIR"]) / output_file
-            results_df.to_excel(result_path, index=False)
+def save_job_input(job_id: str, vins, holder=None, held_until=None) -> None:
+    """Hand a job's VINs to whichever process runs the scheduler.
 
+    ``holder`` marks the job as already running in that scheduler until
+    ``held_until``; unheld jobs are picked up by ``resume_pending``.
+    """
+    conn = get_db_connection()
+    conn.execute(
+        "INSERT OR REPLACE INTO job_inputs (job_id, vins, holder, held_until) VALUES (?, ?, ?, ?)",
+        (job_id, json.dumps(list(vins), separators=(",", ":")), holder, held_until),
+    )
+    conn.commit()
+    conn.close()
+
+
+def delete_job_input(job_id: str) -> None:
+    conn = get_db_connection()
+    conn.execute("DELETE FROM job_inputs WHERE job_id = ?", (job_id,))
+    conn.commit()
+    conn.close()
+
+
+def results_job_id(row) -> str:
+    """Reused jobs read the rows of the job whose output they share."""
+    return row["reused_from_job_id"] or row["job_id"]
+
+
+def count_job_results(job_id: str) -> int:
+    conn = get_db_connection()
+    count = conn.execute("SELECT COUNT(*) FROM job_results WHERE job_id = ?", (job_id,)).fetchone()[0]
+    conn.close()
+    return count
+
+
+def list_job_results(job_id: str, start_index: int, limit: int):
+    """Return up to ``limit`` rows from ``start_index`` on, stopping at the first row not decoded yet.
+
+    Workers finish rows out of order, so a page never skips past a gap: the
+    caller resumes from ``start_index + len(rows)`` and gets the missing row
+    once it lands.
+    """
+    conn = get_db_connection()
+    rows = conn.execute(
+        """
+        SELECT row_index, payload FROM job_results
+        WHERE job_id = ? AND row_index >= ?
+        ORDER BY row_index
+        LIMIT ?
+        """,
+        (job_id, start_index, limit),
+    ).fetchall()
+    conn.close()
+
+    page = []
+    for row in rows:
+        if row["row_index"] != start_index + len(page):
+            break
+        page.append(json.loads(row["payload"]))
+    return page
+
+
+def iter_job_results_csv(db_path, job_id: str, columns, fetch_size: int = 500):
+    """Yield CSV text for the stored rows of ``job_id`` without loading them all at once."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore", restval="")
+
+    def drain():
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return text
+
+    writer.writeheader()
+    yield drain()
+
+    conn = sqlite3.connect(db_path, timeout=10)
+    try:
+        cursor = conn.execute(
+            "SELECT payload FROM job_results WHERE job_id = ? ORDER BY row_index",
+            (job_id,),
+        )
+        while True:
+            batch = cursor.fetchmany(fetch_size)
+            if not batch:
+                break
+            for (payload,) in batch:
+                writer.writerow(json.loads(payload))
+            yield drain()
+    finally:
+        conn.close()
+
+
+class _ScheduledJob:
+    def __init__(self, job_id: str, vins, seq: int, columns=None, decode_mode: str = "online", saved_results=None):
+        self.job_id = job_id
+        self.vins = list(vins)
+        self.columns = columns or output_columns()
+        self.decode_mode = decode_mode
+        self.total = len(self.vins)
+        self.results = [None] * self.total
+        saved_results = saved_results or {}
+        for index, row in saved_results.items():
+            self.results[index] = row
+        self.pending = collections.deque(index for index in range(self.total) if index not in saved_results)
+        self.unsaved = []
+        self.started = bool(saved_results)
+        self.done = len(saved_results)
+        self.seq = seq
+        self.last_turn = 0
+        self.passed_over = 0
+        self.failed = False
+
+    @property
+    def remaining(self) -> int:
+        return self.total - self.done
+
+    @property
+    def unscheduled(self) -> int:
+        return len(self.pending)
+
+
+class JobScheduler:
+    """Interleave VIN decodes from every active job over a fixed worker pool.
+
+    ``shortest_remaining`` always serves the job with the fewest VINs left, so
+    a 20-VIN upload finishes in seconds even while a 30k-VIN job is running.
+    ``round_robin`` gives every active job an equal share instead. Under
+    ``shortest_remaining`` a job passed over ``starvation_limit`` times in a
+    row gets the next turn, so a stream of small uploads slows a large job
+    down but cannot stall it. Queue position and ETA are estimated from the
+    measured decode throughput and flushed to the ``jobs`` table so any web
+    worker can report them.
+
+    Every web worker accepts uploads, but only the process holding the
+    background lease (see ``BackgroundLeader``) decodes. ``submit`` stores
+    the VINs in ``job_inputs``; the leader runs them directly or picks them
+    up with ``resume_pending``, so estimates, throughput and upstream
+    concurrency cover the whole service rather than one worker.
+
+    A scheduler only decodes while ``active``, which the leader extends one
+    lease at a time with ``hold_until``. Each job it runs is marked with its
+    ``holder`` id in ``job_inputs`` for ``hold_seconds`` and renewed with the
+    lease, so a new leader never resumes a job another process is still
+    running. Losing the lease ``relinquish``es every job: workers stop
+    taking VINs from them, their saved results stay, and their holds are
+    cleared for the new leader.
+    """
+
+    POLICIES = ("shortest_remaining", "round_robin")
+
+    def __init__(
+        self,
+        app: Flask,
+        workers: int,
+        policy: str,
+        progress_interval: float = 1.0,
+        starvation_limit: int = 50,
+        hold_seconds: float = 15.0,
+    ):
+        if policy not in self.POLICIES:
+            raise ValueError(f"unknown job scheduling policy: {policy}")
+
+        self.app = app
+        self.workers = max(1, workers)
+        self.policy = policy
+        self.progress_interval = progress_interval
+        self.starvation_limit = max(1, starvation_limit)
+        self.hold_seconds = hold_seconds
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._active_until = math.inf
+        self._cond = threading.Condition()
+        self._jobs = {}
+        self._claimed = set()
+        self._threads = []
+        self._seq = 0
+        self._turn = 0
+        self._completions = collections.deque(maxlen=200)
+        self._last_flush = 0.0
+        self._flush_lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return time.monotonic() < self._active_until
+
+    def hold_until(self, deadline: float) -> None:
+        """Keep decoding until the monotonic ``deadline`` unless renewed again."""
+        with self._cond:
+            self._active_until = deadline
+            self._cond.notify_all()
+
+    def renew_holds(self) -> None:
+        with self.app.app_context():
+            conn = get_db_connection()
+            conn.execute(
+                "UPDATE job_inputs SET held_until = ? WHERE holder = ?",
+                (time.time() + self.hold_seconds, self.holder),
+            )
+            conn.commit()
+            conn.close()
+
+    def relinquish(self) -> int:
+        """Stop decoding and hand every unfinished job back through ``job_inputs``."""
+        with self._cond:
+            self._active_until = 0.0
+            jobs = list(self._jobs.values())
+            self._jobs = {}
+            result_rows = []
+            for job in jobs:
+                result_rows.extend((job.job_id, index, job.results[index]) for index in job.unsaved)
+                job.unsaved = []
+                self._claimed.discard(job.job_id)
+
+        with self.app.app_context():
+            save_job_results(result_rows)
+            conn = get_db_connection()
+            conn.execute(
+                "UPDATE job_inputs SET holder = NULL, held_until = NULL WHERE holder = ?", (self.holder,)
+            )
+            conn.commit()
+            conn.close()
+
+        if jobs:
+            log_event("jobs.relinquished", count=len(jobs))
+        return len(jobs)
+
+    def submit(self, job_id: str, vins, columns=None, decode_mode: str = "online") -> None:
+        vins = list(vins)
+        active = self.active
+        with self.app.app_context():
+            if active:
+                save_job_input(job_id, vins, self.holder, time.time() + self.hold_seconds)
+            else:
+                save_job_input(job_id, vins)
+        if active:
+            self._schedule(job_id, vins, columns, decode_mode)
+
+    def resume_pending(self) -> int:
+        """Schedule unfinished jobs submitted by other workers or left behind by a restart.
+
+        Jobs still held by another scheduler are skipped until that hold is
+        released or lapses.
+        """
+        if not self.active:
+            return 0
+        with self._cond:
+            claimed = set(self._claimed)
+
+        resumed = 0
+        with self.app.app_context():
+            conn = get_db_connection()
+            now = time.time()
+            job_ids = [
+                row["job_id"]
+                for row in conn.execute(
+                    """
+                    SELECT jobs.job_id
+                    FROM jobs JOIN job_inputs ON job_inputs.job_id = jobs.job_id
+                    WHERE jobs.completed = 0 AND jobs.error = 0
+                      AND (job_inputs.holder IS NULL OR job_inputs.holder = ? OR job_inputs.held_until < ?)
+                    ORDER BY jobs.created_at
+                    """,
+                    (self.holder, now),
+                )
+                if row["job_id"] not in claimed
+            ]
+            for job_id in job_ids:
+                held = conn.execute(
+                    """
+                    UPDATE job_inputs SET holder = ?, held_until = ?
+                    WHERE job_id = ? AND (holder IS NULL OR holder = ? OR held_until < ?)
+                    """,
+                    (self.holder, now + self.hold_seconds, job_id, self.holder, now),
+                ).rowcount
+                conn.commit()
+                if not held:
+                    continue
+                row = conn.execute(
+                    """
+                    SELECT jobs.field_list, jobs.decode_mode, job_inputs.vins
+                    FROM jobs JOIN job_inputs ON job_inputs.job_id = jobs.job_id
+                    WHERE jobs.job_id = ?
+                    """,
+                    (job_id,),
+                ).fetchone()
+                if row is None:
+                    continue
+                saved_results = {
+                    result["row_index"]: json.loads(result["payload"])
+                    for result in conn.execute(
+                        "SELECT row_index, payload FROM job_results WHERE job_id = ?", (job_id,)
+                    )
+                }
+                if self._schedule(job_id, json.loads(row["vins"]), job_field_list(row), row["decode_mode"], saved_results):
+                    resumed += 1
+            conn.close()
+
+        if resumed:
+            log_event("jobs.resumed", count=resumed)
+        return resumed
+
+    def _schedule(self, job_id: str, vins, columns, decode_mode: str, saved_results=None) -> bool:
+        with self._cond:
+            if job_id in self._claimed:
+                return False
+            self._claimed.add(job_id)
+            self._seq += 1
+            job = _ScheduledJob(job_id, vins, self._seq, columns, decode_mode, saved_results)
+            if job.pending:
+                self._jobs[job_id] = job
+                self._threads = [thread for thread in self._threads if thread.is_alive()]
+                while len(self._threads) < self.workers:
+                    thread = threading.Thread(target=self._run, name="vin-decoder-job-worker", daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+                self._cond.notify_all()
+                return True
+
+        # Every row was decoded before a restart; only the output is missing.
+        with self.app.app_context():
+            self._finalize(job)
+        self._release(job)
+        return True
+
+    def _release(self, job: _ScheduledJob) -> None:
+        with self._cond:
+            self._claimed.discard(job.job_id)
+
+    def estimates(self):
+        with self._cond:
+            return self._estimates()
+
+    def throughput(self):
+        """Recent decode rate in VINs per second, or ``None`` before enough samples exist."""
+        with self._cond:
+            return self._throughput()
+
+    def _throughput(self):
+        if len(self._completions) < 2:
+            return None
+        span = self._completions[-1] - self._completions[0]
+        if span <= 0:
+            return None
+        return (len(self._completions) - 1) / span
+
+    def _estimates(self):
+        """Return ``{job_id: (queue_position, eta_seconds)}`` for every active job."""
+        jobs = list(self._jobs.values())
+        work_until_done = {}
+        for job in jobs:
+            remaining = job.remaining
+            if self.policy == "shortest_remaining":
+                ahead = sum(
+                    other.remaining
+                    for other in jobs
+                    if other is not job and (other.remaining, other.seq) < (remaining, job.seq)
+                )
+            else:
+                ahead = sum(min(other.remaining, remaining) for other in jobs if other is not job)
+            work_until_done[job.job_id] = ahead + remaining
+
+        rate = self._throughput()
+        ordered = sorted(jobs, key=lambda job: (work_until_done[job.job_id], job.seq))
+        return {
+            job.job_id: (
+                position,
+                round(work_until_done[job.job_id] / rate, 1) if rate else None,
+            )
+            for position, job in enumerate(ordered, start=1)
+        }
+
+    def _pick(self):
+        candidates = [job for job in self._jobs.values() if job.unscheduled and not job.failed]
+        if not candidates:
+            return None
+        if self.policy == "shortest_remaining":
+            starved = [item for item in candidates if item.passed_over >= self.starvation_limit]
+            if starved:
+                job = min(starved, key=lambda item: item.seq)
+            else:
+                job = min(candidates, key=lambda item: (item.unscheduled, item.seq))
+            for item in candidates:
+                item.passed_over += 1
+            job.passed_over = 0
+        else:
+            job = min(candidates, key=lambda item: (item.last_turn, item.seq))
+        self._turn += 1
+        job.last_turn = self._turn
+        return job
+
+    def _progress_rows(self):
+        rows = []
+        for job_id, (position, eta) in self._estimates().items():
+            job = self._jobs[job_id]
+            if not job.started:
+                progress = "Queued"
+            else:
+                progress = f"Processing VIN {min(job.done + 1, job.total)}/{job.total}"
+            rows.append((job_id, progress, job.done, position, eta))
+        return rows
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                job = self._pick() if self.active else None
+                while job is None:
+                    self._cond.wait()
+                    job = self._pick() if self.active else None
+                index = job.pending.popleft()
+                starting = not job.started
+                job.started = True
+
+            try:
+                with self.app.app_context():
+                    if starting:
+                        # Status only: progress columns belong to the batched flush,
+                        # which may already have written newer values.
+                        update_job_record(job.job_id, status="processing")
+                    result = decode_vin(job.vins[index], job.columns, job.decode_mode)
+            except Exception as exc:
+                self._fail(job, exc)
+                continue
+
+            with self._cond:
+                if job.failed or self._jobs.get(job.job_id) is not job:
+                    # Failed, or handed back to the lease holder meanwhile.
+                    continue
+                job.results[index] = result
+                job.unsaved.append(index)
+                job.done += 1
+                now = time.monotonic()
+                self._completions.append(now)
+                finished = job.done == job.total
+                if finished:
+                    self._jobs.pop(job.job_id, None)
+                should_flush = finished or now - self._last_flush >= self.progress_interval
+                if should_flush:
+                    self._last_flush = now
+
+            if should_flush:
+                self._flush(extra_jobs=[job] if finished else ())
+            if finished:
+                with self.app.app_context():
+                    self._finalize(job)
+                self._release(job)
+
+    def _flush(self, extra_jobs=()) -> None:
+        # Serialized so a finishing job never completes while another worker
+        # still holds some of its drained-but-unwritten result rows.
+        with self._flush_lock:
+            with self._cond:
+                progress_rows = self._progress_rows()
+                result_rows = []
+                for job in list(self._jobs.values()) + list(extra_jobs):
+                    result_rows.extend((job.job_id, index, job.results[index]) for index in job.unsaved)
+                    job.unsaved = []
+
+            with self.app.app_context():
+                save_job_results(result_rows)
+                update_job_progress_batch(progress_rows)
+
+    def _fail(self, job: _ScheduledJob, exc: Exception) -> None:
+        with self._cond:
+            if job.failed:
+                return
+            job.failed = True
+            self._jobs.pop(job.job_id, None)
+        with self.app.app_context():
+            mark_job_failed(job.job_id, exc)
+            delete_job_input(job.job_id)
+        self._release(job)
+
+    def _finalize(self, job: _ScheduledJob) -> None:
+        try:
+            output_file = write_job_output(job.job_id, job.results, job.columns)
+            lookup_errors = sum(1 for row in job.results if LOOKUP_ERROR in row.values())
             update_job_record(
-                job_id,
+                job.job_id,
                 status="completed",
                 progress="Completed",
-                current=total,
-                total=total,
+                current=job.total,
+                total=job.total,
                 completed=True,
                 error=False,
                 output_file=output_file,
+                queue_position=None,
+                eta_seconds=None,
                 completed_at=utc_now_iso(),
+                lookup_errors=lookup_errors,
+            )
+            log_event(
+                "job.completed",
+                job_id=job.job_id,
+                total=job.total,
+                lookup_errors=lookup_errors,
+                output_file=output_file,
             )
-            log_event("job.completed", job_id=job_id, total=total, output_file=output_file)
         except Exception as exc:
-            LOGGER.exception("job failed", exc_info=exc)
-            update_job_record(
-                job_id,
-                status="failed",
-                progress="Processing failed. Please try again.",
-                completed=True,
-                error=True,
-                completed_at=utc_now_iso(),
+            mark_job_failed(job.job_id, exc)
+        delete_job_input(job.job_id)
+
+
+class BackgroundLeader:
+    """Elect one process to run the job scheduler, cache refresher and cleanup.
+
+    Gunicorn starts several workers from the same app, but queue positions,
+    ETAs, throughput and the number of concurrent upstream requests only
+    make sense if one process decodes. Workers compete for a lease row in
+    SQLite; the holder renews it every ``poll_seconds``, publishes its
+    measured throughput there for admission control, resumes jobs other
+    workers handed off through ``job_inputs`` and runs periodic cleanup.
+    When the holder dies its lease expires and another worker takes over,
+    picking up the unfinished jobs where their saved results end. A holder
+    that finds its lease taken relinquishes its jobs rather than finishing
+    them alongside the new leader.
+
+    Renewal runs on its own thread. Everything the leader does with files
+    (resuming jobs that may only need their output written, assembling
+    chunked uploads, cleanup) runs on a second thread that each renewal
+    wakes, so a slow disk can never make the lease lapse.
+    """
+
+    LEASE_NAME = "background"
+
+    def __init__(self, app: Flask):
+        self.app = app
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_seconds = app.config["BACKGROUND_LEASE_SECONDS"]
+        self.poll_seconds = app.config["BACKGROUND_POLL_SECONDS"]
+        self.is_leader = False
+        self._next_cleanup = time.monotonic() + app.config["CLEANUP_INTERVAL_SECONDS"]
+        self._stop = threading.Event()
+        self._work_due = threading.Event()
+        self._work_thread = None
+
+    def start(self):
+        if self.poll_seconds > 0:
+            self._work_thread = threading.Thread(
+                target=self._work_loop, name="vin-decoder-background-work", daemon=True
             )
-            log_event("job.failed", job_id=job_id, error=str(exc))
+            self._work_thread.start()
+        self.tick()
+        if self.poll_seconds <= 0:
+            return None
+        thread = threading.Thread(target=self._loop, name="vin-decoder-background", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._work_due.set()
+
+    def _work_loop(self) -> None:
+        while True:
+            self._work_due.wait()
+            self._work_due.clear()
+            if self._stop.is_set():
+                return
+            try:
+                self.run_due_work()
+            except Exception as exc:
+                LOGGER.exception("background work failed", exc_info=exc)
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.tick()
+            except Exception as exc:
+                LOGGER.exception("background leader tick failed", exc_info=exc)
+
+    def tick(self) -> None:
+        scheduler = self.app.extensions["vin_decoder_scheduler"]
+        was_leader = self.is_leader
+        renewed_at = time.monotonic()
+        with self.app.app_context():
+            self.is_leader = self._renew(scheduler.throughput())
+        if self.is_leader != was_leader:
+            log_event("background.lease", holder=self.holder, leader=self.is_leader)
+        if not self.is_leader:
+            if scheduler.active:
+                scheduler.relinquish()
+            return
+
+        # Measured from before the renewal, so the scheduler stops decoding
+        # no later than the lease it wrote expires for everyone else.
+        scheduler.hold_until(renewed_at + self.lease_seconds)
+        scheduler.renew_holds()
+        if self._work_thread is None:
+            self.run_due_work()
+        else:
+            self._work_due.set()
+
+    def run_due_work(self) -> None:
+        if not self.is_leader:
+            return
+        self.app.extensions["vin_decoder_scheduler"].resume_pending()
+        self.app.extensions["vin_decoder_chunked_uploads"].advance_ready()
+        if self.app.config["CLEANUP_SCHEDULER_ENABLED"] and time.monotonic() >= self._next_cleanup:
+            self._next_cleanup = time.monotonic() + self.app.config["CLEANUP_INTERVAL_SECONDS"]
+            try:
+                run_cleanup(self.app)
+            except Exception as exc:
+                LOGGER.exception("cleanup failed", exc_info=exc)
+
+    def _renew(self, throughput) -> bool:
+        now = time.time()
+        conn = get_db_connection()
+        try:
+            current = conn.execute(
+                "SELECT holder, expires_at FROM leases WHERE name = ?", (self.LEASE_NAME,)
+            ).fetchone()
+            if current is not None and current["holder"] != self.holder and current["expires_at"] >= now:
+                return False
+            conn.execute(
+                """
+                INSERT INTO leases (name, holder, expires_at, throughput) VALUES (?, ?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    holder = excluded.holder,
+                    expires_at = excluded.expires_at,
+                    throughput = excluded.throughput
+                WHERE leases.holder = excluded.holder OR leases.expires_at < ?
+                """,
+                (self.LEASE_NAME, self.holder, now + self.lease_seconds, throughput, now),
+            )
+            conn.commit()
+            holder = conn.execute("SELECT holder FROM leases WHERE name = ?", (self.LEASE_NAME,)).fetchone()
+            return holder is not None and holder["holder"] == self.holder
+        finally:
+            conn.close()
+
+
+def leader_throughput():
+    """Decode rate published by the current background leader, if its lease is live."""
+    conn = get_db_connection()
+    row = conn.execute(
+        "SELECT throughput FROM leases WHERE name = ? AND expires_at >= ?",
+        (BackgroundLeader.LEASE_NAME, time.time()),
+    ).fetchone()
+    conn.close()
+    return row["throughput"] if row else None
+
+
+def resolve_rate_limit_storage_uri(app: Flask) -> str:
+    uri = app.config["RATE_LIMIT_STORAGE_URI"]
+    if uri.rstrip("/") == "sqlite:":
+        # Bare sqlite:// keeps limiter counters beside the job database, in
+        # their own file so limiter writes never contend with job updates.
+        return f"sqlite:///{Path(app.config['DATA_DIR']).resolve() / 'rate_limits.sqlite3'}"
+    return uri
+
+
+def count_queued_vins(active_window_minutes: int) -> int:
+    """VINs still to decode across unfinished jobs in every worker process.
+
+    Jobs that have not reported progress within the window are ignored so a
+    job orphaned by a restart cannot block admission forever.
+    """
+    cutoff_iso = (utc_now() - timedelta(minutes=active_window_minutes)).strftime("%Y-%m-%d %H:%M:%S")
+    conn = get_db_connection()
+    queued = conn.execute(
+        "SELECT COALESCE(SUM(total - current), 0) FROM jobs WHERE completed = 0 AND updated_at >= ?",
+        (cutoff_iso,),
+    ).fetchone()[0]
+    conn.close()
+    return max(0, queued)
+
+
+def format_wait(seconds: float) -> str:
+    if seconds < 90:
+        return "a minute"
+    return f"{round(seconds / 60)} minutes"
+
+
+class UploadError(Exception):
+    """An upload that can't become a job; the message is shown to the user."""
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, retry_after: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.message = message
+
+
+class AdmissionController:
+    """Decide whether an upload may be parsed and queued right now.
+
+    Two limits apply. The VIN backlog across all unfinished jobs (read from
+    SQLite, so it covers every Gunicorn worker) is capped at
+    ``max_queued_vins``; beyond it uploads get a 503 with a ``Retry-After``
+    derived from the background leader's measured throughput. Parsing is
+    capped by a number of slots and an estimate of in-flight parse memory,
+    both tracked in the ``parse_slots`` table so the caps hold across
+    workers; when either is exhausted uploads get a 429. A lone upload is always allowed to parse,
+    and an idle queue always accepts a job, so oversized files are slowed
+    down rather than rejected forever.
+    """
+
+    def __init__(self, app: Flask):
+        config = app.config
+        self.app = app
+        self.max_queued_vins = config["ADMISSION_MAX_QUEUED_VINS"]
+        self.active_window_minutes = config["ADMISSION_ACTIVE_JOB_WINDOW_MINUTES"]
+        self.fallback_vins_per_second = config["ADMISSION_FALLBACK_VINS_PER_SECOND"]
+        self.max_parse_bytes = config["ADMISSION_MAX_PARSE_MEMORY_MB"] * 1024 * 1024
+        self.parse_memory_factor = config["ADMISSION_PARSE_MEMORY_FACTOR"]
+        self.parse_slot_wait_seconds = config["ADMISSION_PARSE_SLOT_WAIT_SECONDS"]
+        self.max_concurrent_parses = max(1, config["ADMISSION_MAX_CONCURRENT_PARSES"])
+        # A slot whose worker died is reclaimed once the parse could no longer be running.
+        self.parse_slot_lease_seconds = config["EXCEL_PARSE_TIMEOUT_SECONDS"] + 60
+
+    def throughput(self) -> float:
+        scheduler = self.app.extensions["vin_decoder_scheduler"]
+        if scheduler.active:
+            measured = scheduler.throughput()
+        else:
+            with self.app.app_context():
+                measured = leader_throughput()
+        return measured or self.fallback_vins_per_second
+
+    def check_backlog(self, incoming_vins: int = 0) -> None:
+        if self.max_queued_vins <= 0:
+            return
+
+        queued = count_queued_vins(self.active_window_minutes)
+        if queued == 0 or queued + incoming_vins <= self.max_queued_vins:
+            return
+
+        rate = self.throughput()
+        start_in = queued / rate
+        retry_after = max(5, math.ceil((queued + incoming_vins - self.max_queued_vins) / rate))
+        start_at = (utc_now() + timedelta(seconds=start_in)).strftime("%H:%M UTC")
+        log_event("admission.rejected", reason="backlog", queued_vins=queued, incoming_vins=incoming_vins)
+        raise AdmissionRejected(
+            503,
+            retry_after,
+            f"The decoder is busy: {queued} VINs are queued ahead of you. "
+            f"A new job would start around {start_at}. Please try again in about {format_wait(retry_after)}.",
+        )
+
+    @contextlib.contextmanager
+    def parse_slot(self, upload_bytes: int):
+        estimate = int(upload_bytes * self.parse_memory_factor)
+        retry_after = max(1, math.ceil(self.parse_slot_wait_seconds))
+        busy = AdmissionRejected(
+            429,
+            retry_after,
+            f"Other uploads are being read right now. Please try again in about {retry_after} seconds.",
+        )
+
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.parse_slot_wait_seconds
+        while True:
+            claimed, in_flight_bytes = self._claim_parse_slot(token, estimate)
+            if claimed:
+                break
+            if in_flight_bytes is not None:
+                log_event("admission.rejected", reason="parse_memory", in_flight_bytes=in_flight_bytes)
+                raise busy
+            if time.monotonic() >= deadline:
+                log_event("admission.rejected", reason="parse_slots")
+                raise busy
+            time.sleep(0.05)
+
+        try:
+            yield
+        finally:
+            with self.app.app_context():
+                conn = get_db_connection()
+                conn.execute("DELETE FROM parse_slots WHERE token = ?", (token,))
+                conn.commit()
+                conn.close()
+
+    def _claim_parse_slot(self, token: str, estimate: int):
+        """Return ``(claimed, in_flight_bytes)``; the byte count is set only when memory is the limit."""
+        now = time.time()
+        with self.app.app_context():
+            conn = get_db_connection()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("DELETE FROM parse_slots WHERE expires_at < ?", (now,))
+                slots, in_flight_bytes = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM parse_slots"
+                ).fetchone()
+                if in_flight_bytes and in_flight_bytes + estimate > self.max_parse_bytes:
+                    conn.rollback()
+                    return False, in_flight_bytes
+                if slots >= self.max_concurrent_parses:
+                    conn.rollback()
+                    return False, None
+                conn.execute(
+                    "INSERT INTO parse_slots (token, bytes, expires_at) VALUES (?, ?, ?)",
+                    (token, estimate, now + self.parse_slot_lease_seconds),
+                )
+                conn.commit()
+                return True, None
+            finally:
+                conn.close()
 
 
 def render_index(error=None):
@@ -572,10 +1976,177 @@ def render_index(error=None):
         "index.html",
         error=error,
         template_filename=Path(current_app.config["TEMPLATE_DOWNLOAD_FILE"]).name,
+        field_profiles=list(FIELD_PROFILES),
+        default_field_profile=current_app.config["DEFAULT_FIELD_PROFILE"],
+        decode_modes=DECODE_MODES,
+        default_decode_mode=current_app.config["DEFAULT_DECODE_MODE"],
+        offline_available=get_offline_decoder() is not None,
         recent_jobs=list_recent_jobs(current_app.config["MAX_RECENT_JOBS"]),
     )
 
 
+def reject_upload(rejected: AdmissionRejected):
+    return render_index(error=rejected.message), rejected.status_code, {"Retry-After": str(rejected.retry_after)}
+
+
+def resolve_upload_options(profile, fields, decode_mode):
+    """Validate the per-job options shared by form and chunked uploads; return ``(columns, decode_mode)``."""
+    try:
+        columns = output_columns(resolve_field_selection(profile, fields))
+    except ValueError as exc:
+        raise UploadError(f"{exc}. Choose a field profile or list valid column names.") from exc
+
+    decode_mode = (decode_mode or current_app.config["DEFAULT_DECODE_MODE"]).strip().lower()
+    if decode_mode not in DECODE_MODES:
+        raise UploadError("Unknown decode mode. Choose online or offline decoding.")
+    if decode_mode == "offline" and get_offline_decoder() is None:
+        raise UploadError("Offline decoding is not available: no vPIC snapshot has been imported.")
+    return columns, decode_mode
+
+
+def start_upload_job(job_id, original_name, stored_upload_name, content_hash, columns, decode_mode, vin_series=None):
+    """Turn an upload saved in ``UPLOAD_DIR`` into a queued (or reused) job.
+
+    The file is parsed unless ``vin_series`` was already read from it.
+    Callers check the backlog before accepting the file; here only the
+    size-dependent parse slot and the final VIN count are admitted.
+    Returns the job id to redirect to. Raises ``UploadError`` (the file is
+    deleted) or ``AdmissionRejected`` (the file is left for the caller).
+    """
+    upload_path = Path(current_app.config["UPLOAD_DIR"]) / stored_upload_name
+
+    reusable = find_reusable_job("content_hash", content_hash, columns, decode_mode)
+    if reusable:
+        upload_path.unlink(missing_ok=True)
+        create_reused_job_record(job_id, original_name, reusable, content_hash, reusable["vin_set_hash"])
+        log_event("job.reused", job_id=job_id, reused_from=reusable["job_id"], match="content")
+        return job_id
+
+    admission = current_app.extensions["vin_decoder_admission"]
+    if vin_series is None:
+        try:
+            with admission.parse_slot(upload_path.stat().st_size):
+                vin_series = read_upload_vins(upload_path)
+        except AdmissionRejected:
+            raise
+        except Exception as exc:
+            upload_path.unlink(missing_ok=True)
+            log_event("upload.read_failed", filename=original_name)
+            raise UploadError("We couldn't read that file. Please verify the file isn't corrupted and try again.") from exc
+
+    if vin_series is None:
+        upload_path.unlink(missing_ok=True)
+        raise UploadError("No VIN column found. Make sure one column contains 17-character VIN values.")
+
+    if len(vin_series) == 0:
+        upload_path.unlink(missing_ok=True)
+        raise UploadError("No valid VIN values were found in the uploaded file.")
+
+    vin_set_hash = hash_vin_set(vin_series)
+    reusable = find_reusable_job("vin_set_hash", vin_set_hash, columns, decode_mode)
+    if reusable:
+        upload_path.unlink(missing_ok=True)
+        create_reused_job_record(job_id, original_name, reusable, content_hash, vin_set_hash)
+        log_event("job.reused", job_id=job_id, reused_from=reusable["job_id"], match="vin_set")
+        return job_id
+
+    admission.check_backlog(len(vin_series))
+
+    create_job_record(
+        job_id,
+        original_name,
+        stored_upload_name,
+        len(vin_series),
+        content_hash,
+        vin_set_hash,
+        columns,
+        decode_mode,
+    )
+    log_event("job.created", job_id=job_id, source_filename=original_name, total=len(vin_series))
+
+    current_app.extensions["vin_decoder_scheduler"].submit(job_id, vin_series, columns, decode_mode)
+    return job_id
+
+
+def serialize_chunked_upload(row):
+    parts = current_app.extensions["vin_decoder_chunked_uploads"].list_parts(row["upload_id"])
+    received = {part["part_number"] for part in parts}
+    payload = {
+        "upload_id": row["upload_id"],
+        "filename": row["filename"],
+        "part_size": min(current_app.config["CHUNKED_UPLOAD_PART_MB"] * 1024 * 1024, current_app.config["MAX_CONTENT_LENGTH"]),
+        "total_parts": row["total_parts"],
+        "received_parts": [dict(part) for part in parts],
+        "received_bytes": sum(part["size"] for part in parts),
+        "assembled_parts": row["assembled_parts"],
+        "vins_found": row["vins_found"],
+        "job_id": row["job_id"],
+    }
+    if row["total_parts"]:
+        payload["missing_parts"] = [number for number in range(1, row["total_parts"] + 1) if number not in received]
+    if row["job_id"]:
+        payload["status_url"] = url_for("status_for_job", job_id=row["job_id"])
+        payload["job_url"] = url_for("job_status_page", job_id=row["job_id"])
+    return payload
+
+
+def finish_chunked_upload(upload_id: str, expected_sha256: str = None):
+    """Create the job for a fully assembled upload and return its id.
+
+    Returns ``None`` while the upload is still being assembled or another
+    request is completing it. The job id is stored in the ``uploads`` row
+    only after the job row is committed, so a retried or concurrent
+    ``complete`` never sees a job that may yet be turned away. If admission
+    rejects the job, the claim is released and the assembled file is kept,
+    so the client only has to retry ``complete``.
+    """
+    store = current_app.extensions["vin_decoder_chunked_uploads"]
+    lease_seconds = current_app.config["EXCEL_PARSE_TIMEOUT_SECONDS"] + ASSEMBLY_LEASE_SECONDS
+    row = store.claim_completion(upload_id, lease_seconds)
+    if row is None:
+        current = store.get(upload_id)
+        return current["job_id"] if current else None
+
+    if expected_sha256 and row["content_sha256"] != expected_sha256:
+        store.release(upload_id)
+        raise UploadError("The assembled file does not match the expected checksum.")
+
+    job_id = uuid.uuid4().hex
+    try:
+        vin_series = None
+        if Path(row["filename"]).suffix.lower() in INCREMENTAL_EXTENSIONS:
+            # The last record is held back until the file is complete; scan it
+            # now. The state is not saved, so a rejected attempt can be repeated.
+            state = dict(row)
+            state.update(store.scan_vins(row, final=True))
+            vin_series = store.read_scanned_vins(state)
+            if vin_series is None:
+                raise UploadError("No VIN column found. Make sure one column contains 17-character VIN values.")
+
+        job_id = start_upload_job(
+            job_id,
+            row["filename"],
+            row["stored_upload_name"],
+            row["content_sha256"],
+            json.loads(row["field_list"]),
+            row["decode_mode"],
+            vin_series,
+        )
+    except AdmissionRejected:
+        store.release(upload_id)
+        raise
+    except UploadError:
+        store.delete(upload_id, row["stored_upload_name"])
+        raise
+    except Exception:
+        store.release(upload_id)
+        raise
+
+    store.mark_completed(upload_id, job_id)
+    log_event("upload.completed", upload_id=upload_id, job_id=job_id, size=row["assembled_bytes"])
+    return job_id
+
+
 def create_app(config_class=None, overrides=None):
     config_class = config_class or get_config_class()
 
@@ -592,27 +2163,52 @@ def create_app(config_class=None, overrides=None):
     app.secret_key = os.urandom(24)
     app.wsgi_app = ProxyFix(app.wsgi_app, x_prefix=1)
     app.config["ALLOWED_EXTENSIONS"] = {"xlsx", "xls", "csv"}
-    app.config["NHTSA_API_BASE"] = "https://vpic.nhtsa.dot.gov/api/vehicles/decodevin/"
     app.config["MAX_CONTENT_LENGTH"] = app.config["MAX_CONTENT_LENGTH"]
 
     ensure_directories(app)
     setup_logging(app)
     init_db(app)
     app.extensions["vin_decoder_http_session"] = build_requests_session()
+    app.extensions["vin_decoder_cache_refresher"] = CacheRefresher(
+        app,
+        per_minute=app.config["CACHE_REFRESH_PER_MINUTE"],
+        max_pending=app.config["CACHE_REFRESH_MAX_PENDING"],
+    )
+    app.extensions["vin_decoder_scheduler"] = JobScheduler(
+        app,
+        workers=app.config["JOB_WORKERS"],
+        policy=app.config["JOB_SCHEDULING_POLICY"],
+        progress_interval=app.config["JOB_PROGRESS_INTERVAL_SECONDS"],
+        starvation_limit=app.config["JOB_STARVATION_LIMIT"],
+        hold_seconds=app.config["BACKGROUND_LEASE_SECONDS"],
+    )
+    app.extensions["vin_decoder_admission"] = AdmissionController(app)
+    app.extensions["vin_decoder_chunked_uploads"] = chunked_uploads = ChunkedUploadStore(
+        app.config["DB_PATH"],
+        app.config["UPLOAD_DIR"],
+        max_bytes=app.config["CHUNKED_UPLOAD_MAX_MB"] * 1024 * 1024,
+    )
+    app.extensions["vin_decoder_background"] = background = BackgroundLeader(app)
+    background.start()
 
     limiter = Limiter(
         get_remote_address,
         app=app,
         default_limits=[app.config["DEFAULT_RATE_LIMIT"]],
-        storage_uri=app.config["RATE_LIMIT_STORAGE_URI"],
+        storage_uri=resolve_rate_limit_storage_uri(app),
     )
 
     @app.route("/", methods=["GET", "POST"])
     @limiter.limit(app.config["DEFAULT_RATE_LIMIT"])
     def index():
-        run_cleanup_if_due()
-
         if request.method == "POST":
+            try:
+                # Before touching request.files, which parses and spools the
+                # whole multipart body.
+                app.extensions["vin_decoder_admission"].check_backlog()
+            except AdmissionRejected as rejected:
+                return reject_upload(rejected)
+
             uploaded_file = request.files.get("file")
             if not uploaded_file or not uploaded_file.filename:
                 return render_index(error="Please choose a CSV or Excel file before submitting.")
@@ -620,44 +2216,130 @@ def create_app(config_class=None, overrides=None):
             if not allowed_file(uploaded_file.filename):
                 return render_index(error="Unsupported file type. Please upload a CSV, XLS, or XLSX file.")
 
+            try:
+                columns, decode_mode = resolve_upload_options(
+                    request.form.get("profile"),
+                    parse_field_list(request.form.getlist("fields")),
+                    request.form.get("decode_mode"),
+                )
+            except UploadError as exc:
+                return render_index(error=str(exc))
+
             job_id = uuid.uuid4().hex
             original_name = secure_filename(uploaded_file.filename)
             stored_upload_name = f"source_{job_id}_{original_name}"
             upload_path = Path(app.config["UPLOAD_DIR"]) / stored_upload_name
-            uploaded_file.save(upload_path)
+            content_hash = save_upload(uploaded_file, upload_path)
 
             try:
-                if upload_path.suffix.lower() in (".xlsx", ".xls"):
-                    df = pd.read_excel(upload_path)
-                else:
-                    df = pd.read_csv(upload_path)
-            except Exception:
+                job_id = start_upload_job(job_id, original_name, stored_upload_name, content_hash, columns, decode_mode)
+            except AdmissionRejected as rejected:
                 upload_path.unlink(missing_ok=True)
-                log_event("upload.read_failed", filename=original_name)
-                return render_index(error="We couldn't read that file. Please verify the file isn't corrupted and try again.")
+                return reject_upload(rejected)
+            except UploadError as exc:
+                return render_index(error=str(exc))
+            return redirect(url_for("job_status_page", job_id=job_id))
 
-            vin_column = find_vin_column(df)
-            if not vin_column:
-                upload_path.unlink(missing_ok=True)
-                return render_index(error="No VIN column found. Make sure one column contains 17-character VIN values.")
+        return render_index()
 
-            vin_series = df[vin_column].dropna().astype(str).str.upper().unique()
-            if len(vin_series) == 0:
-                upload_path.unlink(missing_ok=True)
-                return render_index(error="No valid VIN values were found in the uploaded file.")
+    @app.route("/uploads", methods=["POST"])
+    def create_upload():
+        payload = request.get_json(silent=True) or {}
+        original_name = secure_filename(str(payload.get("filename") or ""))
+        if not original_name or not allowed_file(original_name):
+            return jsonify({"error": "filename must name a CSV, XLS, or XLSX file."}), 400
 
-            create_job_record(job_id, original_name, stored_upload_name, len(vin_series))
-            log_event("job.created", job_id=job_id, source_filename=original_name, total=len(vin_series))
+        total_parts = payload.get("total_parts")
+        if total_parts is not None and (not isinstance(total_parts, int) or total_parts < 1):
+            return jsonify({"error": "total_parts must be a positive integer."}), 400
 
-            thread = threading.Thread(
-                target=process_vins_in_background,
-                args=(app, job_id, vin_series),
-                daemon=True,
+        fields = payload.get("fields")
+        if isinstance(fields, str):
+            fields = [fields]
+        try:
+            columns, decode_mode = resolve_upload_options(
+                payload.get("profile"),
+                parse_field_list(fields),
+                payload.get("decode_mode"),
             )
-            thread.start()
-            return redirect(url_for("job_status_page", job_id=job_id))
+        except UploadError as exc:
+            return jsonify({"error": str(exc)}), 400
 
-        return render_index()
+        upload_id = chunked_uploads.create(original_name, total_parts, columns, decode_mode)
+        log_event("upload.created", upload_id=upload_id, filename=original_name, total_parts=total_parts)
+        return jsonify(serialize_chunked_upload(chunked_uploads.get(upload_id))), 201
+
+    @app.route("/uploads/<upload_id>")
+    def upload_status(upload_id: str):
+        row = chunked_uploads.get(upload_id)
+        if not row:
+            return jsonify({"error": "Upload not found."}), 404
+        return jsonify(serialize_chunked_upload(row))
+
+    @app.route("/uploads/<upload_id>/parts/<int:part_number>", methods=["PUT"])
+    def upload_part(upload_id: str, part_number: int):
+        row = chunked_uploads.get(upload_id)
+        if not row:
+            return jsonify({"error": "Upload not found."}), 404
+        if row["job_id"]:
+            return jsonify({"error": "Upload is already complete."}), 409
+        if part_number < 1 or (row["total_parts"] and part_number > row["total_parts"]):
+            return jsonify({"error": f"Part number must be between 1 and {row['total_parts'] or 'total_parts'}."}), 400
+
+        expected_sha256 = (request.headers.get("X-Part-SHA256") or "").strip().lower()
+        if len(expected_sha256) != 64:
+            return jsonify({"error": "Send the part's SHA-256 hex digest in the X-Part-SHA256 header."}), 400
+
+        rejected = chunked_uploads.save_part(row, part_number, request.stream, expected_sha256)
+        if rejected:
+            status_code, message = rejected
+            return jsonify({"error": message}), status_code
+
+        # Only the background leader assembles; it keeps each upload's running hash.
+        if background.is_leader:
+            chunked_uploads.advance(upload_id)
+        return jsonify(serialize_chunked_upload(chunked_uploads.get(upload_id)))
+
+    @app.route("/uploads/<upload_id>/complete", methods=["POST"])
+    def complete_upload(upload_id: str):
+        row = chunked_uploads.get(upload_id)
+        if not row:
+            return jsonify({"error": "Upload not found."}), 404
+
+        payload = request.get_json(silent=True) or {}
+        if not row["job_id"]:
+            total_parts = payload.get("total_parts") or row["total_parts"]
+            if not isinstance(total_parts, int) or total_parts < 1:
+                return jsonify({"error": "total_parts is required to complete an upload."}), 400
+            if row["total_parts"] != total_parts:
+                discarded = chunked_uploads.declare_total_parts(upload_id, total_parts)
+                if discarded:
+                    log_event("upload.parts_discarded", upload_id=upload_id, parts=discarded)
+            received = [part["part_number"] for part in chunked_uploads.list_parts(upload_id)]
+            if received != list(range(1, total_parts + 1)):
+                body = serialize_chunked_upload(chunked_uploads.get(upload_id))
+                body["missing_parts"] = sorted(set(range(1, total_parts + 1)) - set(received))
+                body["error"] = "Some parts are missing."
+                return jsonify(body), 409
+            if background.is_leader:
+                chunked_uploads.advance(upload_id)
+
+        expected_sha256 = (payload.get("sha256") or "").strip().lower() or None
+        try:
+            job_id = finish_chunked_upload(upload_id, expected_sha256)
+        except AdmissionRejected as rejected:
+            return jsonify({"error": rejected.message}), rejected.status_code, {"Retry-After": str(rejected.retry_after)}
+        except UploadError as exc:
+            return jsonify({"error": str(exc)}), 422
+
+        row = chunked_uploads.get(upload_id)
+        if row is None:
+            return jsonify({"error": "Upload not found."}), 404
+        body = serialize_chunked_upload(row)
+        if not job_id:
+            body["message"] = "The upload is still being assembled. Retry after the given delay."
+            return jsonify(body), 202, {"Retry-After": str(app.config["CHUNKED_UPLOAD_RETRY_AFTER_SECONDS"])}
+        return jsonify(body), 201
 
     @app.route("/jobs/<job_id>")
     def job_status_page(job_id: str):
@@ -696,6 +2378,58 @@ def create_app(config_class=None, overrides=None):
             download_name=f"decoded_{job_id}.xlsx",
         )
 
+    @app.route("/jobs/<job_id>/results")
+    def job_results(job_id: str):
+        row = get_job_record(job_id)
+        if not row:
+            return jsonify({"error": "Job not found."}), 404
+
+        try:
+            # ``offset`` is a row index in upload order; ``row_index`` is accepted as an alias.
+            offset = int(request.args.get("offset", request.args.get("row_index", 0)))
+            limit = int(request.args.get("limit", app.config["RESULTS_PAGE_SIZE"]))
+        except ValueError:
+            return jsonify({"error": "offset and limit must be integers."}), 400
+        if offset < 0 or limit < 1:
+            return jsonify({"error": "offset must be >= 0 and limit must be >= 1."}), 400
+        limit = min(limit, app.config["RESULTS_PAGE_MAX"])
+
+        source_job_id = results_job_id(row)
+        rows = list_job_results(source_job_id, offset, limit)
+        next_row_index = offset + len(rows)
+        # A short page of a running job only means later rows are still being
+        # decoded; the client polls again from the same index. Once the job
+        # has finished, a short page is the last one.
+        finished = row["completed"] or row["error"]
+        exhausted = next_row_index >= row["total"] or (finished and len(rows) < limit)
+        return jsonify(
+            {
+                "job_id": job_id,
+                "status": row["status"],
+                "completed": bool(row["completed"]),
+                "total": row["total"],
+                "available": count_job_results(source_job_id),
+                "offset": offset,
+                "limit": limit,
+                "rows": rows,
+                "next_row_index": None if exhausted else next_row_index,
+            }
+        )
+
+    @app.route("/jobs/<job_id>/results.csv")
+    def download_partial_results(job_id: str):
+        row = get_job_record(job_id)
+        if not row:
+            abort(404)
+
+        body = iter_job_results_csv(app.config["DB_PATH"], results_job_id(row), job_field_list(row))
+        suffix = "" if row["completed"] else "_partial"
+        return Response(
+            body,
+            mimetype="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="decoded_{job_id}{suffix}.csv"'},
+        )
+
     @app.route("/download-template")
     def download_template():
         return send_file(
@@ -707,8 +2441,24 @@ def create_app(config_class=None, overrides=None):
     return app
 
 
-app = create_app()
+DEFAULT_APP_LOCK = threading.Lock()
+
+
+def __getattr__(name: str):
+    """Build ``vin_decoder:app`` for Gunicorn and ``flask --app`` on first access.
+
+    Creating it at import time would also run in every spawned Excel parse
+    process, which re-imports the main script, and in anything that only
+    imports helpers (tests included): opening the database, running
+    migrations and starting a background leader each time.
+    """
+    if name != "app":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with DEFAULT_APP_LOCK:
+        if "app" not in globals():
+            globals()["app"] = create_app()
+    return globals()["app"]
 
 
 if __name__ == "__main__":
-    app.run(debug=False, host="0.0.0.0", port=5000)
+    create_app().run(debug=False, host="0.0.0.0", port=5000)
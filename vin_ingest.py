@@ -0,0 +1,226 @@
+"""Upload parsing helpers that stay cheap on memory for large spreadsheets.
+
+This module deliberately avoids importing Flask or the app module so the
+Excel reader can run in a spawned worker process without re-creating the app.
+"""
+
+import csv
+import hashlib
+import io
+import multiprocessing
+import re
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+VIN_REGEX = re.compile(r"^(?!.*[IOQ])[A-HJ-NPR-Z0-9]{17}$", re.IGNORECASE)
+
+STREAMING_EXCEL_EXTENSIONS = {".xlsx"}
+
+# Formats whose VIN column can be read from a prefix of the file. Excel
+# workbooks keep their directory at the end, so they are parsed only once
+# every byte has arrived.
+INCREMENTAL_EXTENSIONS = {".csv"}
+
+
+class UploadTooLarge(ValueError):
+    """Raised by :func:`save_stream` once a stream passes its byte limit."""
+
+
+def save_stream(stream, path, max_bytes: Optional[int] = None, chunk_size: int = 1024 * 1024) -> Tuple[int, str]:
+    """Copy ``stream`` to ``path``; return ``(size, sha256 hex)``.
+
+    Raises ``UploadTooLarge`` once more than ``max_bytes`` have been read.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "wb") as handle:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if max_bytes is not None and size > max_bytes:
+                raise UploadTooLarge("The upload is larger than the configured limit.")
+            digest.update(chunk)
+            handle.write(chunk)
+    return size, digest.hexdigest()
+
+
+def _cell_text(value) -> Optional[str]:
+    if value is None:
+        return None
+    text = str(value).strip()
+    return text or None
+
+
+def detect_vin_column(row: Sequence) -> Optional[int]:
+    """Return the index of the leftmost cell in ``row`` that holds a VIN."""
+    for index, value in enumerate(row):
+        text = _cell_text(value)
+        if text and VIN_REGEX.match(text):
+            return index
+    return None
+
+
+def iter_sheet_vin_values(worksheet) -> Iterator[str]:
+    """Yield the raw values of the VIN column of one read-only worksheet.
+
+    Rows are scanned in full only until the first VIN is seen; everything
+    above it is treated as header/preamble. The remaining rows are read with
+    a single-column window so openpyxl never builds cells for other columns.
+    """
+    vin_column = None
+    first_vin_row = 0
+    for row_number, row in enumerate(worksheet.iter_rows(values_only=True), start=1):
+        vin_column = detect_vin_column(row)
+        if vin_column is not None:
+            first_vin_row = row_number
+            yield _cell_text(row[vin_column])
+            break
+
+    if vin_column is None:
+        return
+
+    column = vin_column + 1
+    for (value,) in worksheet.iter_rows(
+        min_row=first_vin_row + 1,
+        min_col=column,
+        max_col=column,
+        values_only=True,
+    ):
+        text = _cell_text(value)
+        if text:
+            yield text
+
+
+def scan_csv_vin_values(stream, vin_column: Optional[int] = None, final: bool = False) -> Tuple[List[str], Optional[int], int]:
+    """Pull VIN column values out of the CSV records in the binary ``stream``.
+
+    Records are read with one ``csv.reader`` over a text view of the stream
+    (``newline=""``), so quoted newlines and ``\r``-only line endings are
+    handled like any other CSV. Meant to be called repeatedly on a file that
+    is still growing, each time from the offset the previous call consumed:
+    unless ``final``, the last record is left for the next call because it
+    may be cut off mid-line or mid-quote. ``vin_column`` carries the
+    detected column from one call to the next; detection matches
+    :func:`iter_sheet_vin_values`. Returns ``(values, vin_column, consumed_bytes)``.
+    """
+    at_start = stream.tell() == 0
+    text = io.TextIOWrapper(stream, encoding="utf-8", errors="surrogateescape", newline="")
+    read_bytes = 0
+
+    def lines():
+        nonlocal read_bytes
+        for number, line in enumerate(text):
+            read_bytes += len(line.encode("utf-8", "surrogateescape"))
+            if number == 0 and at_start and line.startswith("\ufeff"):
+                line = line[1:]
+            yield line
+
+    values = []
+    consumed = 0
+    pending = None
+
+    def take(row):
+        nonlocal vin_column
+        if vin_column is None:
+            vin_column = detect_vin_column(row)
+            if vin_column is None:
+                return
+        if vin_column < len(row):
+            value = _cell_text(row[vin_column])
+            if value:
+                values.append(value.encode("utf-8", "surrogateescape").decode("utf-8", "replace"))
+
+    try:
+        for row in csv.reader(lines()):
+            if pending is not None:
+                take(pending[0])
+                consumed = pending[1]
+            pending = (row, read_bytes)
+        if final and pending is not None:
+            take(pending[0])
+            consumed = pending[1]
+    finally:
+        text.detach()
+    return values, vin_column, consumed
+
+
+def read_csv_vins(path) -> Optional[List[str]]:
+    """Unique, upper-cased VIN column values of a CSV file, or ``None`` without a VIN column."""
+    with open(path, "rb") as handle:
+        values, vin_column, _ = scan_csv_vin_values(handle, final=True)
+    if vin_column is None:
+        return None
+    return unique_vins(values)
+
+
+def unique_vins(values: Iterable[str]) -> List[str]:
+    """Upper-case ``values`` and drop repeats, keeping file order."""
+    seen = {}
+    for value in values:
+        seen.setdefault(value.upper(), None)
+    return list(seen)
+
+
+def iter_workbook_vin_values(path, sheet_names: Optional[Iterable[str]] = None) -> Iterator[str]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(filename=str(path), read_only=True, data_only=True)
+    try:
+        wanted = set(sheet_names) if sheet_names else None
+        for worksheet in workbook.worksheets:
+            if wanted is not None and worksheet.title not in wanted:
+                continue
+            yield from iter_sheet_vin_values(worksheet)
+    finally:
+        workbook.close()
+
+
+def read_workbook_vins(path, sheet_names: Optional[Iterable[str]] = None) -> List[str]:
+    """Return unique, upper-cased VIN column values across all sheets, in file order."""
+    return unique_vins(iter_workbook_vin_values(path, sheet_names))
+
+
+def _read_workbook_vins_child(path: str, conn) -> None:
+    try:
+        conn.send(("ok", read_workbook_vins(path)))
+    except BaseException as exc:  # report anything to the parent instead of dying silently
+        conn.send(("error", f"{type(exc).__name__}: {exc}"))
+    finally:
+        conn.close()
+
+
+def read_workbook_vins_isolated(path, timeout: Optional[float] = None) -> List[str]:
+    """Run :func:`read_workbook_vins` in a short-lived worker process.
+
+    The parse is CPU-bound and would otherwise hold the GIL of the web worker
+    for the whole workbook. Each call gets its own process, so ``timeout``
+    covers only this parse and a stuck or killed child affects no other
+    upload. Concurrency is bounded by the caller (the admission parse slots).
+    """
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(
+        target=_read_workbook_vins_child,
+        args=(str(Path(path)), sender),
+        name="vin-decoder-excel-parse",
+        daemon=True,
+    )
+    process.start()
+    sender.close()
+    try:
+        if not receiver.poll(timeout):
+            raise TimeoutError(f"parsing {Path(path).name} took longer than {timeout} seconds")
+        try:
+            status, result = receiver.recv()
+        except EOFError:
+            raise RuntimeError(f"parse process exited with code {process.exitcode}") from None
+        if status != "ok":
+            raise RuntimeError(result)
+        return result
+    finally:
+        receiver.close()
+        if process.is_alive():
+            process.terminate()
+        process.join(5)
@@ -0,0 +1,371 @@
+"""Offline VIN decoding from an imported NHTSA vPIC snapshot.
+
+NHTSA publishes the full vPIC database for standalone use. Export these
+tables to CSV (one file per table, original column names) and import them::
+
+    python vpic_offline.py import /path/to/vpic_csv --db data/vpic.sqlite3
+
+Required files:
+
+- ``Wmi.csv`` — ``Id, Wmi, ManufacturerId, MakeId, VehicleTypeId``
+- ``Wmi_VinSchema.csv`` — ``WmiId, VinSchemaId, YearFrom, YearTo``
+- ``Pattern.csv`` — ``VinSchemaId, Keys, ElementId, AttributeId``
+- ``Element.csv`` — ``Id, Name, LookupTable``
+
+Optional files: ``Wmi_Make.csv`` (``WmiId, MakeId``) for snapshots where
+makes are linked separately, and one ``<LookupTable>.csv`` (``Id, Name``)
+per lookup table referenced from ``Element.csv`` (``Make``, ``Model``,
+``BodyStyle``, ``Manufacturer``, ``VehicleType``, ...). Pattern values that
+point into a lookup table are resolved at import time, so decoding only
+touches two small indexed tables.
+
+Decoding follows vPIC: the WMI and model year select VIN schemas, and each
+schema pattern's ``Keys`` is matched against the VIN descriptor (positions
+4-8, ``|``, positions 10-17). When several patterns set the same element,
+the most specific one wins. Element names are the same "Variable" names
+the vPIC API returns, so results map through ``FLEET_FIELD_MAP`` unchanged.
+"""
+
+import argparse
+import csv
+import functools
+import os
+import re
+import sqlite3
+import sys
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+MODEL_YEAR_CODES = "ABCDEFGHJKLMNPRSTVWXY123456789"
+
+_CompiledPattern = Tuple["re.Pattern", int, str, str]
+
+
+def decode_model_year(vin: str) -> Optional[int]:
+    """Model year from position 10, using position 7 to pick the 30-year cycle.
+
+    This is the rule for passenger cars and light trucks: a numeric
+    position 7 means 1980-2009, a letter means 2010-2039.
+    """
+    if len(vin) < 10:
+        return None
+    index = MODEL_YEAR_CODES.find(vin[9].upper())
+    if index < 0:
+        return None
+    year = 1980 + index
+    if not vin[6].isdigit():
+        year += 30
+    return year
+
+
+def wmi_for_vin(vin: str) -> str:
+    """Small manufacturers (position 3 is ``9``) are identified by positions 1-3 plus 12-14."""
+    vin = vin.upper()
+    if len(vin) >= 14 and vin[2] == "9":
+        return vin[:3] + vin[11:14]
+    return vin[:3]
+
+
+def vin_descriptor(vin: str) -> str:
+    vin = vin.upper()
+    return f"{vin[3:8]}|{vin[9:17]}"
+
+
+@functools.lru_cache(maxsize=65536)
+def compile_keys(keys: str) -> Tuple["re.Pattern", int]:
+    """Translate a vPIC pattern key (``*`` wildcard, ``[A-C]`` classes) into a prefix regex.
+
+    Returns the regex and a specificity score: the number of non-wildcard positions.
+    """
+    parts = []
+    specificity = 0
+    index = 0
+    while index < len(keys):
+        char = keys[index]
+        if char == "*":
+            parts.append(".")
+        elif char == "[":
+            end = keys.find("]", index)
+            if end < 0:
+                parts.append(re.escape(char))
+            else:
+                parts.append(keys[index:end + 1])
+                specificity += 1
+                index = end
+        else:
+            parts.append(re.escape(char.upper()))
+            specificity += 1
+        index += 1
+    return re.compile("".join(parts)), specificity
+
+
+def _read_csv(path: Path) -> Iterator[Dict[str, str]]:
+    with open(path, newline="", encoding="utf-8-sig") as handle:
+        yield from csv.DictReader(handle)
+
+
+def _to_int(value) -> Optional[int]:
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def _load_lookup(source_dir: Path, table: Optional[str]) -> Dict[str, str]:
+    if not table:
+        return {}
+    path = source_dir / f"{table}.csv"
+    if not path.is_file():
+        return {}
+    return {row["Id"].strip(): row["Name"] for row in _read_csv(path) if row.get("Id")}
+
+
+def import_snapshot(source_dir, db_path) -> Dict[str, int]:
+    """Build the compact offline database at ``db_path`` from vPIC CSV exports.
+
+    The database is written to a temporary file and moved into place, so a
+    running app never sees a half-imported snapshot.
+    """
+    source_dir = Path(source_dir)
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = db_path.with_name(db_path.name + ".importing")
+    tmp_path.unlink(missing_ok=True)
+
+    elements = {}
+    lookups = {}
+    for row in _read_csv(source_dir / "Element.csv"):
+        table = (row.get("LookupTable") or "").strip() or None
+        elements[row["Id"].strip()] = (row["Name"], table)
+        if table and table not in lookups:
+            lookups[table] = _load_lookup(source_dir, table)
+
+    makes = lookups.get("Make") or _load_lookup(source_dir, "Make")
+    manufacturers = lookups.get("Manufacturer") or _load_lookup(source_dir, "Manufacturer")
+    vehicle_types = lookups.get("VehicleType") or _load_lookup(source_dir, "VehicleType")
+
+    wmi_makes = {}
+    if (source_dir / "Wmi_Make.csv").is_file():
+        for row in _read_csv(source_dir / "Wmi_Make.csv"):
+            wmi_makes.setdefault(row["WmiId"].strip(), row["MakeId"].strip())
+
+    wmis = {}
+    for row in _read_csv(source_dir / "Wmi.csv"):
+        wmi_id = row["Id"].strip()
+        make_id = (row.get("MakeId") or "").strip() or wmi_makes.get(wmi_id, "")
+        wmis[wmi_id] = (
+            row["Wmi"].strip().upper(),
+            makes.get(make_id),
+            manufacturers.get((row.get("ManufacturerId") or "").strip()),
+            vehicle_types.get((row.get("VehicleTypeId") or "").strip()),
+        )
+
+    conn = sqlite3.connect(tmp_path)
+    conn.execute("PRAGMA journal_mode=OFF;")
+    conn.execute("PRAGMA synchronous=OFF;")
+    conn.executescript(
+        """
+        CREATE TABLE wmi_schemas (
+            wmi TEXT NOT NULL,
+            schema_id INTEGER NOT NULL,
+            year_from INTEGER,
+            year_to INTEGER,
+            make TEXT,
+            manufacturer TEXT,
+            vehicle_type TEXT
+        );
+        CREATE TABLE patterns (
+            schema_id INTEGER NOT NULL,
+            keys TEXT NOT NULL,
+            variable TEXT NOT NULL,
+            value TEXT
+        );
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+        """
+    )
+
+    counts = {"wmi_schemas": 0, "patterns": 0}
+    batch = []
+    for row in _read_csv(source_dir / "Wmi_VinSchema.csv"):
+        wmi = wmis.get(row["WmiId"].strip())
+        if not wmi:
+            continue
+        batch.append((wmi[0], _to_int(row["VinSchemaId"]), _to_int(row.get("YearFrom")), _to_int(row.get("YearTo"))) + wmi[1:])
+    conn.executemany("INSERT INTO wmi_schemas VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+    counts["wmi_schemas"] = len(batch)
+
+    batch = []
+    for row in _read_csv(source_dir / "Pattern.csv"):
+        element = elements.get(row["ElementId"].strip())
+        if not element:
+            continue
+        name, table = element
+        value = row.get("AttributeId")
+        if table and value is not None:
+            value = lookups.get(table, {}).get(value.strip(), value)
+        batch.append((_to_int(row["VinSchemaId"]), row["Keys"].strip().upper(), name, value))
+        if len(batch) >= 10000:
+            conn.executemany("INSERT INTO patterns VALUES (?, ?, ?, ?)", batch)
+            counts["patterns"] += len(batch)
+            batch = []
+    conn.executemany("INSERT INTO patterns VALUES (?, ?, ?, ?)", batch)
+    counts["patterns"] += len(batch)
+
+    conn.execute("CREATE INDEX idx_wmi_schemas_wmi ON wmi_schemas (wmi)")
+    conn.execute("CREATE INDEX idx_patterns_schema_id ON patterns (schema_id)")
+    conn.executemany(
+        "INSERT INTO meta (key, value) VALUES (?, ?)",
+        [
+            ("imported_at", datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")),
+            ("source", str(source_dir.resolve())),
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+    os.replace(tmp_path, db_path)
+    return counts
+
+
+class OfflineDecoder:
+    """Decode VINs against an imported snapshot.
+
+    Patterns are loaded and compiled once per VIN schema and kept in an LRU
+    cache, so a warm decode is a handful of regex matches in memory.
+    """
+
+    def __init__(self, db_path, schema_cache_size: int = 2048):
+        self.db_path = str(db_path)
+        self._local = threading.local()
+        self.schema_patterns = functools.lru_cache(maxsize=schema_cache_size)(self._schema_patterns)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+            self._local.conn = conn
+        return conn
+
+    def _schema_patterns(self, schema_id: int) -> List[_CompiledPattern]:
+        rows = self._connection().execute(
+            "SELECT keys, variable, value FROM patterns WHERE schema_id = ?",
+            (schema_id,),
+        ).fetchall()
+        compiled = []
+        for keys, variable, value in rows:
+            regex, specificity = compile_keys(keys)
+            compiled.append((regex, specificity, variable, value))
+        return compiled
+
+    def _wmi_rows(self, wmi: str, model_year: Optional[int]):
+        """Return the WMI's schemas covering ``model_year`` and whether any did.
+
+        A year outside every schema (a snapshot gap, or a heavy vehicle whose
+        position 7 doesn't follow the car rule) returns every schema, nearest
+        year range first, so the WMI itself still decodes.
+        """
+        rows = self._connection().execute(
+            "SELECT schema_id, year_from, year_to, make, manufacturer, vehicle_type FROM wmi_schemas WHERE wmi = ?",
+            (wmi,),
+        ).fetchall()
+        if model_year is None:
+            return rows, True
+        in_range = [
+            row
+            for row in rows
+            if (row[1] is None or row[1] <= model_year) and (row[2] is None or model_year <= row[2])
+        ]
+        if in_range:
+            return in_range, True
+
+        def distance(row):
+            year_from, year_to = row[1], row[2]
+            if year_from is not None and model_year < year_from:
+                return year_from - model_year
+            return model_year - year_to
+
+        return sorted(rows, key=distance), False
+
+    def decode(self, vin: str) -> Optional[Dict[str, str]]:
+        """Return ``{variable: value}`` like the vPIC API, or ``None`` for an unknown WMI.
+
+        When no schema covers the model year only the WMI-level fields (make,
+        manufacturer, vehicle type) and the year are returned: patterns from
+        other years' schemas would mix models that never shared a VIN layout.
+        """
+        vin = vin.strip().upper()
+        if len(vin) != 17:
+            return None
+
+        model_year = decode_model_year(vin)
+        rows, year_matched = self._wmi_rows(wmi_for_vin(vin), model_year)
+        if not rows:
+            return None
+
+        descriptor = vin_descriptor(vin)
+        best = {}
+        for schema_id, *_ in rows if year_matched else ():
+            for regex, specificity, variable, value in self.schema_patterns(schema_id):
+                if value is None or not regex.match(descriptor):
+                    continue
+                current = best.get(variable)
+                if current is None or specificity > current[0]:
+                    best[variable] = (specificity, value)
+
+        decoded = {variable: value for variable, (_, value) in best.items()}
+        _, _, _, make, manufacturer, vehicle_type = rows[0]
+        for variable, value in (
+            ("Make", make),
+            ("Manufacturer Name", manufacturer),
+            ("Vehicle Type", vehicle_type),
+            ("Model Year", str(model_year) if model_year else None),
+        ):
+            if value and not decoded.get(variable):
+                decoded[variable] = value
+        return decoded
+
+
+def load_offline_decoder(db_path) -> Optional[OfflineDecoder]:
+    """Return a decoder for ``db_path``, or ``None`` when no snapshot has been imported."""
+    if not db_path or not Path(db_path).is_file():
+        return None
+    return OfflineDecoder(db_path)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Manage the offline vPIC snapshot.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="import vPIC CSV exports into a local SQLite database")
+    import_parser.add_argument("source_dir", help="directory containing Wmi.csv, Wmi_VinSchema.csv, Pattern.csv, Element.csv, ...")
+    import_parser.add_argument("--db", help="output database (defaults to VPIC_OFFLINE_DB from config)")
+
+    decode_parser = subparsers.add_parser("decode", help="decode VINs with the imported snapshot")
+    decode_parser.add_argument("vins", nargs="+")
+    decode_parser.add_argument("--db", help="snapshot database (defaults to VPIC_OFFLINE_DB from config)")
+
+    args = parser.parse_args(argv)
+    db_path = args.db
+    if not db_path:
+        from config import get_config_class
+
+        db_path = get_config_class().VPIC_OFFLINE_DB
+
+    if args.command == "import":
+        counts = import_snapshot(args.source_dir, db_path)
+        print(f"Imported {counts['wmi_schemas']} WMI schemas and {counts['patterns']} patterns into {db_path}")
+        return 0
+
+    decoder = load_offline_decoder(db_path)
+    if decoder is None:
+        print(f"No offline snapshot found at {db_path}", file=sys.stderr)
+        return 1
+    for vin in args.vins:
+        print(vin, decoder.decode(vin))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())